@@ -0,0 +1,99 @@
+# benchmarks/bench_dedup.py
+#
+# Compare the old "latest inspection per establishment" path (string
+# establishment_id + sort_values + groupby.first) with the integer-key idxmax
+# path in scripts/establishments.py on synthetic inspections.
+#
+# Usage (from the project root):
+#   python benchmarks/bench_dedup.py                     # 1x, 10x, 100x
+#   python benchmarks/bench_dedup.py --scales 1 10       # skip the 30M-row run
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+from establishments import latest_per_establishment  # noqa: E402
+
+# size of the raw Chicago inspections file when the pipeline was written
+BASE_ROWS = 301_259
+INSPECTIONS_PER_ESTABLISHMENT = 7
+
+
+def synthetic_inspections(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    n_establishments = max(1, n_rows // INSPECTIONS_PER_ESTABLISHMENT)
+    establishment = rng.integers(0, n_establishments, n_rows)
+    # shared string objects, like the repeated values pandas gets from read_csv
+    addresses = np.array([f"{i} W MADISON ST" for i in range(n_establishments)], dtype=object)
+    names = np.array([f"ESTABLISHMENT {i}" for i in range(n_establishments)], dtype=object)
+    risks = np.array(["Risk 1 (High)", "Risk 2 (Medium)", "Risk 3 (Low)"], dtype=object)
+    return pd.DataFrame({
+        "inspection_id": np.arange(n_rows),
+        "dba_name": names[establishment],
+        "license_": (establishment + 1_000_000).astype(float),
+        "risk": risks[rng.integers(0, 3, n_rows)],
+        "address": addresses[establishment],
+        "inspection_date": pd.Timestamp("2010-01-01")
+        + pd.to_timedelta(rng.integers(0, 5_500, n_rows), unit="D"),
+        "violations": "32. FOOD AND NON-FOOD CONTACT SURFACES CLEAN - Comments: ...",
+    })
+
+
+def dedup_old(df):
+    df = df.copy()
+    df["establishment_id"] = (
+        df["license_"].fillna("UNKNOWN").astype(str)
+        + "_"
+        + df["address"].fillna("UNKNOWN").astype(str)
+    )
+    return (
+        df
+        .sort_values("inspection_date", ascending=False)
+        .groupby("establishment_id", as_index=False)
+        .first()
+        .drop(columns=["establishment_id"])
+    )
+
+
+def dedup_new(df):
+    return latest_per_establishment(df)
+
+
+def same_result(a, b):
+    cols = ["license_", "address", "inspection_date"]
+    a = a[cols].sort_values(cols).reset_index(drop=True)
+    b = b[cols].sort_values(cols).reset_index(drop=True)
+    return a.equals(b)
+
+
+def timed(func, df):
+    start = time.perf_counter()
+    out = func(df)
+    return out, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark latest-inspection de-duplication.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100],
+                        help="multiples of the current inspection count")
+    parser.add_argument("--base-rows", type=int, default=BASE_ROWS)
+    args = parser.parse_args(argv)
+
+    print(f"{'scale':>6} {'rows':>12} {'old (s)':>9} {'new (s)':>9} {'speedup':>8}  match")
+    for scale in args.scales:
+        n_rows = int(args.base_rows * scale)
+        df = synthetic_inspections(n_rows)
+        old, t_old = timed(dedup_old, df)
+        new, t_new = timed(dedup_new, df)
+        match = same_result(old, new)
+        print(f"{scale:>6g} {n_rows:>12,} {t_old:>9.2f} {t_new:>9.2f} {t_old / t_new:>7.1f}x  {match}")
+        del df, old, new
+
+
+if __name__ == "__main__":
+    main()
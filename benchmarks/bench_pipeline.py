@@ -0,0 +1,196 @@
+# benchmarks/bench_pipeline.py
+#
+# Offline performance gate for the pipeline. Writes synthetic raw inputs (see
+# synthetic_data.py) at each scale into a temporary directory, then runs food
+# cleaning, ZHVI cleaning, integration and the stage-05 statistics in process
+# through the same functions scripts/pipeline.py uses. Reports wall time,
+# throughput and peak traced memory per stage, and compares them with the
+# stored baseline in benchmarks/baseline.json.
+#
+# Timing and memory come from separate passes, because tracemalloc slows pandas
+# down noticeably.
+#
+# Usage (from the project root):
+#   python benchmarks/bench_pipeline.py                       # compare with the baseline
+#   python benchmarks/bench_pipeline.py --scales 0.1 1 10
+#   python benchmarks/bench_pipeline.py --save-baseline       # record a new baseline
+#
+# Exits with status 1 when a stage is slower than the baseline by more than
+# --tolerance (default 30%) at the same scale.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parents[0] / "scripts"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from pipeline import stage  # noqa: E402
+from synthetic_data import write_raw  # noqa: E402
+from zhvi import build_aggregates  # noqa: E402
+
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+STAGES = ["clean_food", "clean_zhvi", "integrate", "stats"]
+
+
+def stage_calls(raw_dir, results_dir, n_resamples):
+    # -> list of (stage name, callable returning (result, rows processed)); each
+    # callable takes the results of the earlier stages
+    food_stage = stage("03_data_cleaning_food")
+    zhvi_stage = stage("03_data_cleaning_zhvi")
+    integration = stage("04_data_integration")
+    analysis = stage("05_data_analysis_visualization")
+
+    def clean_food(done):
+        food = food_stage.clean_food(raw_dir / "food_inspections.csv")
+        return food, done["n_inspections"]
+
+    def clean_zhvi(done):
+        meta, values, months = zhvi_stage.clean_zhvi(raw_dir / "zhvi.csv")
+        return (meta, values, months), done["n_zips"]
+
+    def integrate(done):
+        meta, values, months = done["clean_zhvi"]
+        zhvi_meta = meta.reset_index(drop=True)
+        zhvi_meta = zhvi_meta[[col for col in integration.ZHVI_METADATA_COLUMNS if col in zhvi_meta.columns]]
+        tables, _ = integration.integrate(done["clean_food"], zhvi_meta, build_aggregates(meta, values, months))
+        integrated = tables["integrated_food_housing"]
+        return integrated, len(done["clean_food"])
+
+    def stats(done):
+        integrated = done["integrate"]
+        zip_level = analysis.zip_level_from_integrated(integrated[analysis.ANALYSIS_COLUMNS])
+        analysis.write_stats(zip_level, results_dir, n_resamples=n_resamples)
+        return zip_level, len(integrated)
+
+    return [("clean_food", clean_food), ("clean_zhvi", clean_zhvi),
+            ("integrate", integrate), ("stats", stats)]
+
+
+def run_stages(raw_dir, results_dir, sizes, n_resamples, trace_memory):
+    # -> {stage: {"seconds", "rows", "peak_mb"?}}
+    done = dict(sizes)
+    measurements = {}
+    for name, call in stage_calls(raw_dir, results_dir, n_resamples):
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        # the stage functions print progress reports; keep the benchmark output readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            result, rows = call(done)
+        seconds = time.perf_counter() - start
+        measurement = {"seconds": seconds, "rows": rows}
+        if trace_memory:
+            measurement["peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+        measurements[name] = measurement
+        done[name] = result
+    return measurements
+
+
+def bench_scale(scale, n_resamples, repeats, memory):
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as tmp:
+        tmp = Path(tmp)
+        _, _, n_inspections, n_zips = write_raw(tmp / "data" / "raw", scale)
+        sizes = {"n_inspections": n_inspections, "n_zips": n_zips}
+        (tmp / "results").mkdir()
+        # the stages write instrumentation records relative to the working directory
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            runs = [run_stages(Path("data/raw"), Path("results"), sizes, n_resamples, trace_memory=False)
+                    for _ in range(repeats)]
+            peaks = run_stages(Path("data/raw"), Path("results"), sizes, n_resamples, trace_memory=True) if memory else None
+        finally:
+            os.chdir(cwd)
+
+    result = {}
+    for name in STAGES:
+        seconds = min(run[name]["seconds"] for run in runs)
+        rows = runs[0][name]["rows"]
+        result[name] = {
+            "seconds": round(seconds, 4),
+            "rows": rows,
+            "rows_per_s": round(rows / seconds, 1) if seconds > 0 else None,
+        }
+        if peaks is not None:
+            result[name]["peak_mb"] = round(peaks[name]["peak_mb"], 1)
+    return result
+
+
+def machine():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic data.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[0.1, 1],
+                        help="multiples of the real input sizes")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="timing passes per scale (the fastest is reported)")
+    parser.add_argument("--resamples", type=int, default=10_000,
+                        help="resamples used by the stage-05 significance table")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the tracemalloc pass")
+    parser.add_argument("--tolerance", type=float, default=0.30,
+                        help="allowed slowdown against the baseline before failing")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="write these results as the new baseline instead of comparing")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if Path(args.baseline).exists():
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    print(f"{'scale':>6} {'stage':<11} {'rows':>10} {'seconds':>9} {'rows/s':>12} {'peak MB':>8} {'vs base':>8}")
+    for scale in args.scales:
+        key = f"{scale:g}"
+        results[key] = bench_scale(scale, args.resamples, args.repeats, memory=not args.no_memory)
+        for name, m in results[key].items():
+            base = baseline.get("scales", {}).get(key, {}).get(name)
+            change = ""
+            if base:
+                ratio = m["seconds"] / base["seconds"]
+                change = f"{ratio - 1:+.0%}"
+                if ratio > 1 + args.tolerance:
+                    regressions.append(f"{name} at scale {key}: {base['seconds']:.3f} s -> {m['seconds']:.3f} s")
+            peak = f"{m['peak_mb']:.1f}" if "peak_mb" in m else "-"
+            print(f"{key:>6} {name:<11} {m['rows']:>10,} {m['seconds']:>9.3f} "
+                  f"{m['rows_per_s']:>12,.0f} {peak:>8} {change:>8}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"machine": machine(), "resamples": args.resamples, "scales": results}, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if baseline and baseline.get("machine") != machine():
+        print(f"\nNote: the baseline was recorded on {baseline.get('machine')}")
+    if regressions:
+        print(f"\nSlower than the baseline by more than {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
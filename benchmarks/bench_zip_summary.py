@@ -0,0 +1,113 @@
+# benchmarks/bench_zip_summary.py
+#
+# Compare the old ZIP-level risk summary (groupby-size + pivot + fillna +
+# renames + per-column divisions + housing groupby) with the bincount-based
+# zip_summary() in scripts/zip_summary.py on synthetic integrated data.
+#
+# Usage (from the project root):
+#   python benchmarks/bench_zip_summary.py
+#   python benchmarks/bench_zip_summary.py --scales 1 100 1000
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+from zip_summary import HOUSING_VALUE_COLUMNS, zip_summary  # noqa: E402
+
+# size of the integrated dataset when the pipeline was written
+BASE_ROWS = 17_366
+N_ZIPS = 58
+
+
+def synthetic_integrated(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    zips = np.arange(60601, 60601 + N_ZIPS, dtype=np.int32)
+    zip_values = rng.normal(340_000, 100_000, (N_ZIPS, 3))
+    row_zip = rng.integers(0, N_ZIPS, n_rows)
+    risk = pd.Categorical.from_codes(
+        rng.choice(3, n_rows, p=[0.73, 0.19, 0.08]),
+        categories=["Risk 1 (High)", "Risk 2 (Medium)", "Risk 3 (Low)"],
+    )
+    df = pd.DataFrame({"zip": zips[row_zip], "risk": risk})
+    for i, col in enumerate(HOUSING_VALUE_COLUMNS):
+        df[col] = zip_values[row_zip, i]
+    return df
+
+
+def summary_old(integrated_data):
+    risk_counts = (
+        integrated_data
+        .groupby(["zip", "risk"], observed=True)
+        .size()
+        .reset_index(name="n_inspections")
+    )
+    risk_counts["risk"] = risk_counts["risk"].astype(str)
+    risk_pivot = (
+        risk_counts
+        .pivot(index="zip", columns="risk", values="n_inspections")
+        .fillna(0)
+    )
+    risk_pivot = risk_pivot.rename(columns={
+        "Risk 1 (High)": "high_risk_count",
+        "Risk 2 (Medium)": "medium_risk_count",
+        "Risk 3 (Low)": "low_risk_count",
+    })
+    risk_pivot["total_inspections"] = (
+        risk_pivot["high_risk_count"]
+        + risk_pivot["medium_risk_count"]
+        + risk_pivot["low_risk_count"]
+    )
+    risk_pivot["high_risk_prop"] = risk_pivot["high_risk_count"] / risk_pivot["total_inspections"]
+    risk_pivot["medium_risk_prop"] = risk_pivot["medium_risk_count"] / risk_pivot["total_inspections"]
+    risk_pivot["low_risk_prop"] = risk_pivot["low_risk_count"] / risk_pivot["total_inspections"]
+    housing_zip = (
+        integrated_data
+        .groupby("zip")[HOUSING_VALUE_COLUMNS]
+        .mean()
+        .reset_index()
+    )
+    return risk_pivot.reset_index().merge(housing_zip, on="zip", how="inner")
+
+
+def summary_new(integrated_data):
+    housing_zip = integrated_data.groupby("zip")[HOUSING_VALUE_COLUMNS].first().reset_index()
+    return zip_summary(integrated_data, housing_zip)
+
+
+def best_of(func, df, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = func(df)
+        times.append(time.perf_counter() - start)
+    return out, min(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ZIP-level risk summary.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100],
+                        help="multiples of the current integrated row count")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'scale':>6} {'rows':>12} {'old (ms)':>9} {'new (ms)':>9} {'speedup':>8}  match")
+    for scale in args.scales:
+        n_rows = int(BASE_ROWS * scale)
+        df = synthetic_integrated(n_rows)
+        old, t_old = best_of(summary_old, df, args.repeats)
+        new, t_new = best_of(summary_new, df, args.repeats)
+        match = np.allclose(
+            old.drop(columns="zip").to_numpy(dtype=float),
+            new.drop(columns="zip").to_numpy(dtype=float),
+        )
+        print(f"{scale:>6g} {n_rows:>12,} {t_old * 1e3:>9.1f} {t_new * 1e3:>9.1f} "
+              f"{t_old / t_new:>7.1f}x  {match}")
+
+
+if __name__ == "__main__":
+    main()
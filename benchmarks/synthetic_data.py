@@ -0,0 +1,136 @@
+# benchmarks/synthetic_data.py
+#
+# Synthetic raw inputs with the same schema as the files written by
+# 01_data_acquisition.py: the Socrata food inspections export (the columns
+# 03_data_cleaning_food.py keeps plus the flattened location columns) and the
+# Zillow ZIP-level ZHVI wide table (metadata columns followed by one column per
+# month). Sizes are given as multiples of the real files, and the same seed
+# always produces the same files.
+#
+# Usage (from the project root):
+#   python benchmarks/synthetic_data.py /tmp/synthetic --scale 0.1
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# sizes of the real inputs when the pipeline was written
+BASE_INSPECTIONS = 301_259
+BASE_ZHVI_ZIPS = 26_300
+INSPECTIONS_PER_ESTABLISHMENT = 7
+ZHVI_MONTHS = pd.date_range("2000-01-31", "2025-10-31", freq="ME").strftime("%Y-%m-%d")
+
+CHICAGO_ZIPS = np.arange(60601, 60662)
+RISKS = np.array(["Risk 1 (High)", "Risk 2 (Medium)", "Risk 3 (Low)", "All"], dtype=object)
+RISK_P = [0.70, 0.19, 0.10, 0.01]
+FACILITIES = np.array(["Restaurant", "Grocery Store", "School", "Children's Services Facility",
+                       "Bakery", "Daycare (2 - 6 Years)", "Long Term Care"], dtype=object)
+RESULTS = np.array(["Pass", "Fail", "Pass w/ Conditions", "Out of Business", "No Entry"], dtype=object)
+INSPECTION_TYPES = np.array(["Canvass", "License", "Complaint", "Canvass Re-Inspection"], dtype=object)
+VIOLATIONS = np.array([
+    "3. MANAGEMENT, FOOD EMPLOYEE AND CONDITIONAL EMPLOYEE; KNOWLEDGE - Comments: NO EMPLOYEE HEALTH POLICY",
+    "38. INSECTS, RODENTS, & ANIMALS NOT PRESENT - Comments: OBSERVED MICE DROPPINGS | "
+    "55. PHYSICAL FACILITIES INSTALLED, MAINTAINED & CLEAN - Comments: CLEAN WALLS",
+    "47. FOOD & NON-FOOD CONTACT SURFACES CLEANABLE, PROPERLY DESIGNED - Comments: REPLACE CUTTING BOARDS | "
+    "49. NON-FOOD/FOOD CONTACT SURFACES CLEAN - Comments: CLEAN INTERIOR OF COOLERS | "
+    "58. ALLERGEN TRAINING AS REQUIRED - Comments: NO ALLERGEN TRAINING",
+    "10. ADEQUATE HANDWASHING SINKS PROPERLY SUPPLIED AND ACCESSIBLE - Comments: NO SOAP AT HAND SINK",
+], dtype=object)
+
+
+def food_inspections(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    n_establishments = max(1, n_rows // INSPECTIONS_PER_ESTABLISHMENT)
+    establishment = rng.integers(0, n_establishments, n_rows)
+    establishment_zip = CHICAGO_ZIPS[rng.integers(0, len(CHICAGO_ZIPS), n_establishments)]
+    zips = establishment_zip[establishment]
+
+    zip_text = zips.astype(str).astype(object)
+    malformed = rng.random(n_rows) < 0.002
+    zip_text[malformed] = "0000"
+    missing_license = rng.random(n_rows) < 0.001
+
+    dates = pd.Timestamp("2010-01-04") + pd.to_timedelta(rng.integers(0, 5_700, n_rows), unit="D")
+    latitude = 41.75 + (zips - 60601) * 0.004 + rng.normal(0, 0.002, n_rows)
+    longitude = -87.70 + (zips - 60601) * 0.001 + rng.normal(0, 0.002, n_rows)
+    return pd.DataFrame({
+        "inspection_id": np.arange(n_rows) + 1_000_000,
+        "dba_name": np.char.add("ESTABLISHMENT ", establishment.astype(str)).astype(object),
+        "aka_name": np.char.add("AKA ", establishment.astype(str)).astype(object),
+        "license_": np.where(missing_license, np.nan, establishment + 1_000_000.0),
+        "facility_type": FACILITIES[rng.integers(0, len(FACILITIES), n_rows)],
+        "risk": RISKS[rng.choice(len(RISKS), n_rows, p=RISK_P)],
+        "address": np.char.add(establishment.astype(str), " W MADISON ST").astype(object),
+        "city": "CHICAGO",
+        "state": "IL",
+        "zip": zip_text,
+        "inspection_date": dates.strftime("%Y-%m-%dT00:00:00.000"),
+        "inspection_type": INSPECTION_TYPES[rng.integers(0, len(INSPECTION_TYPES), n_rows)],
+        "results": RESULTS[rng.integers(0, len(RESULTS), n_rows)],
+        "violations": VIOLATIONS[rng.integers(0, len(VIOLATIONS), n_rows)],
+        "latitude": latitude,
+        "longitude": longitude,
+        "location.type": "Point",
+        "location.coordinates": "[" + pd.Series(longitude).round(6).astype(str) + ", "
+                                + pd.Series(latitude).round(6).astype(str) + "]",
+    })
+
+
+def zhvi_wide(n_zips, seed=0):
+    # the Chicago ZIPs come first so the food data always has housing matches
+    rng = np.random.default_rng(seed + 1)
+    n_zips = max(n_zips, len(CHICAGO_ZIPS))
+    pool = np.setdiff1d(np.arange(10_000, 99_000), CHICAGO_ZIPS)
+    others = np.sort(rng.choice(pool, n_zips - len(CHICAGO_ZIPS), replace=False))
+    region = np.concatenate([CHICAGO_ZIPS, others])
+    chicago = np.arange(n_zips) < len(CHICAGO_ZIPS)
+
+    trend = np.linspace(0.55, 1.45, len(ZHVI_MONTHS), dtype=np.float32)
+    values = rng.lognormal(12.4, 0.5, (n_zips, 1)).astype(np.float32) * trend[None, :]
+    # ZIPs that enter the series late, and scattered missing months
+    start = np.where(rng.random(n_zips) < 0.3, rng.integers(0, len(ZHVI_MONTHS), n_zips), 0)
+    values[np.arange(len(ZHVI_MONTHS))[None, :] < start[:, None]] = np.nan
+    values[rng.random(values.shape) < 0.01] = np.nan
+
+    meta = pd.DataFrame({
+        "RegionID": np.arange(n_zips) + 58_000,
+        "SizeRank": np.arange(n_zips),
+        "RegionName": region,
+        "RegionType": "zip",
+        "StateName": np.where(chicago, "IL", "CA"),
+        "State": np.where(chicago, "IL", "CA"),
+        "City": np.where(chicago, "Chicago", "Other"),
+        "Metro": np.where(chicago, "Chicago-Naperville-Elgin, IL-IN-WI", "Other Metro"),
+        "CountyName": np.where(chicago, "Cook County", "Other County"),
+    })
+    return pd.concat([meta, pd.DataFrame(values, columns=ZHVI_MONTHS)], axis=1)
+
+
+def write_raw(raw_dir, scale=1.0, seed=0):
+    # -> (food path, zhvi path, n_inspections, n_zhvi_zips)
+    raw_dir = Path(raw_dir)
+    raw_dir.mkdir(parents=True, exist_ok=True)
+    n_inspections = max(1, int(BASE_INSPECTIONS * scale))
+    n_zips = max(len(CHICAGO_ZIPS), int(BASE_ZHVI_ZIPS * scale))
+    food_inspections(n_inspections, seed).to_csv(raw_dir / "food_inspections.csv", index=False)
+    zhvi_wide(n_zips, seed).to_csv(raw_dir / "zhvi.csv", index=False)
+    return raw_dir / "food_inspections.csv", raw_dir / "zhvi.csv", n_inspections, n_zips
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic raw food inspection and ZHVI files.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiple of the real input sizes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    food_path, zhvi_path, n_inspections, n_zips = write_raw(args.output_dir, args.scale, args.seed)
+    print(f"{food_path}: {n_inspections:,} inspections")
+    print(f"{zhvi_path}: {n_zips:,} ZIPs x {len(ZHVI_MONTHS)} months")
+
+
+if __name__ == "__main__":
+    main()
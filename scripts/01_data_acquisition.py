@@ -1,64 +1,304 @@
-# scripts/01_data_acquisition.py
+import argparse
+import json
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 import hashlib
 from pathlib import Path
 
-def main():
-    OUTPUT_DIR = Path("data/raw")
+from checksums import sidecar_path, write_checksum
+from instrument import step
+
+API_ENDPOINT = "https://data.cityofchicago.org/resource/4ijn-s7e5.json"
+PAGE_LIMIT = 50000
+ZHVI_URL = "https://files.zillowstatic.com/research/public_csvs/zhvi/Zip_zhvi_uc_sfrcondo_tier_0.33_0.67_sm_sa_month.csv?t=1762826225"   # the Zillow URL you used
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Socrata fields used for paging order and the incremental high-water mark;
+# other cities' inspection datasets name them differently
+DATE_FIELD = "inspection_date"
+ID_FIELD = "inspection_id"
+
+
+def load_state(state_path):
+    if state_path.exists():
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(state_path, state):
+    # write to a temp file first so an interrupted run never leaves half a state file
+    tmp_path = state_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    tmp_path.replace(state_path)
+
+
+def high_water_where(high_water, date_field=DATE_FIELD):
+    # rows on the high-water date itself are re-requested and de-duplicated by
+    # inspection_id afterwards, because inspection_id is not ordered by date
+    if not high_water:
+        return None
+    return f"{date_field} >= '{high_water['inspection_date']}'"
+
+
+def compute_high_water(records, previous=None, date_field=DATE_FIELD, id_field=ID_FIELD):
+    high_water = dict(previous) if previous else None
+    for rec in records:
+        date = rec.get(date_field)
+        if date is None:
+            continue
+        if high_water is None or date > high_water["inspection_date"]:
+            high_water = {"inspection_date": date, "inspection_ids": []}
+        if date == high_water["inspection_date"]:
+            inspection_id = str(rec.get(id_field))
+            if inspection_id not in high_water["inspection_ids"]:
+                high_water["inspection_ids"].append(inspection_id)
+    return high_water
+
+
+def make_session(workers):
+    # one keep-alive session shared by all worker threads, with retry/backoff
+    # on rate limiting and transient server errors
+    retry = Retry(
+        total=5,
+        backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def fetch_count(session, endpoint, where):
+    params = {"$select": "count(*)"}
+    if where:
+        params["$where"] = where
+    resp = session.get(endpoint, params=params)
+    resp.raise_for_status()
+    payload = resp.json()
+    # Socrata names the column "count" (newer) or "count_1"/"COUNT" (older)
+    return int(next(iter(payload[0].values())))
+
+
+def fetch_page(session, endpoint, where, offset, limit, order=f"{DATE_FIELD} ASC, {ID_FIELD} ASC"):
+    params = {
+        "$limit": limit,
+        "$offset": offset,
+        "$order": order,
+    }
+    if where:
+        params["$where"] = where
+    resp = session.get(endpoint, params=params)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def fetch_pages(endpoint, where, staging_path, state, state_path, limit=PAGE_LIMIT, workers=4,
+                order=f"{DATE_FIELD} ASC, {ID_FIELD} ASC"):
+    # pages are appended to a JSON-lines staging file in offset order and the
+    # checkpoint is advanced after each one, so a rerun resumes from the last
+    # completed page even though pages are downloaded concurrently
+    checkpoint = state.get("checkpoint")
+    if checkpoint and checkpoint.get("where") == where and staging_path.exists():
+        offset = checkpoint["offset"]
+        print(f"Resuming from checkpoint at offset {offset}...")
+    else:
+        offset = 0
+        staging_path.unlink(missing_ok=True)
+
+    session = make_session(workers)
+    row_count = fetch_count(session, endpoint, where)
+    print(f"Rows to fetch: {row_count} (starting at offset {offset}, {workers} workers)")
+
+    # keep at most two pages per worker in flight so memory stays bounded
+    total = offset
+    next_offset = offset
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # past the counted rows, keep requesting one page at a time in
+            # case rows were added upstream after the count was taken
+            while len(pending) < workers * 2 and (next_offset < row_count or not pending):
+                future = pool.submit(fetch_page, session, endpoint, where, next_offset, limit, order)
+                pending.append((next_offset, future))
+                next_offset += limit
+
+            # reassemble in order; a page is only committed once every page
+            # before it has been written
+            page_offset, future = pending.popleft()
+            payload = future.result()
+            if len(payload) > 0:
+                with open(staging_path, "a", encoding="utf-8") as f:
+                    for rec in payload:
+                        f.write(json.dumps(rec) + "\n")
+                total += len(payload)
+                print(f"  Retrieved {len(payload)} records at offset {page_offset} (Total so far: {total})")
+
+            state["checkpoint"] = {"where": where, "offset": page_offset + limit}
+            save_state(state_path, state)
+
+            if len(payload) < limit:
+                for _, future in pending:
+                    future.cancel()
+                break
+    session.close()
+
+
+def read_staged(staging_path):
+    records = []
+    if staging_path.exists():
+        with open(staging_path, "r", encoding="utf-8") as f:
+            for line in f:
+                records.append(json.loads(line))
+    return records
+
+
+def fetch_food_inspections(output_dir, endpoint=API_ENDPOINT, incremental=False, limit=PAGE_LIMIT, workers=4,
+                           date_field=DATE_FIELD, id_field=ID_FIELD):
+    food_path = output_dir / "food_inspections.csv"
+    state_path = output_dir / "food_inspections.state.json"
+    staging_path = output_dir / "food_inspections.staging.jsonl"
+
+    state = load_state(state_path)
+    high_water = state.get("high_water") if incremental and food_path.exists() else None
+    if incremental and high_water is None:
+        print("No high-water mark found; falling back to a full download.")
+    where = high_water_where(high_water, date_field)
+    if where:
+        print(f"Incremental fetch with $where: {where}")
+
+    fetch_pages(endpoint, where, staging_path, state, state_path, limit=limit, workers=workers,
+                order=f"{date_field} ASC, {id_field} ASC")
+    records = read_staged(staging_path)
+
+    # drop rows we already stored at the high-water date (and any page
+    # duplicated by a resume between writing it and saving the checkpoint)
+    seen_ids = set(high_water["inspection_ids"]) if high_water else set()
+    new_records = []
+    for rec in records:
+        inspection_id = str(rec.get(id_field))
+        if inspection_id in seen_ids:
+            continue
+        seen_ids.add(inspection_id)
+        new_records.append(rec)
+    print(f"\nSuccessfully fetched {len(new_records)} new records")
+
+    new_rows = pd.json_normalize(new_records)
+
+    if where is None:
+        new_rows.to_csv(food_path, index=False)
+    elif len(new_rows) > 0:
+        existing_columns = pd.read_csv(food_path, nrows=0).columns.tolist()
+        if set(new_rows.columns) <= set(existing_columns):
+            new_rows.reindex(columns=existing_columns).to_csv(
+                food_path, mode="a", header=False, index=False
+            )
+        else:
+            # new fields appeared upstream: rewrite with the union of columns
+            existing = pd.read_csv(food_path, dtype=str)
+            pd.concat([existing, new_rows], ignore_index=True).to_csv(food_path, index=False)
+    print(f"Wrote {len(new_rows)} records to {food_path}")
+
+    state["high_water"] = compute_high_water(new_records, previous=high_water,
+                                             date_field=date_field, id_field=id_field)
+    state.pop("checkpoint", None)
+    save_state(state_path, state)
+    staging_path.unlink(missing_ok=True)
+
+    return food_path
+
+
+def download_zhvi(output_dir, csv_url=ZHVI_URL):
+    zhvi_path = output_dir / "zhvi.csv"
+    sha_path = sidecar_path(zhvi_path)
+    http_path = output_dir / "zhvi.http.json"
+
+    # conditional GET: only valid if the file and checksum from last time are still there
+    headers = {}
+    cached = load_state(http_path) if zhvi_path.exists() and sha_path.exists() else {}
+    if cached.get("url") == csv_url:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    with requests.get(csv_url, headers=headers, stream=True) as response:
+        if response.status_code == 304:
+            print(f"ZHVI unchanged upstream (304); keeping {zhvi_path} and its checksum")
+            return zhvi_path
+        response.raise_for_status()
+
+        # hash chunks as they are written so the file is never held in memory
+        # or read back a second time
+        sha = hashlib.sha256()
+        part_path = zhvi_path.with_suffix(".csv.part")
+        with open(part_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+                sha.update(chunk)
+        part_path.replace(zhvi_path)
+
+        write_checksum(zhvi_path, sha=sha.hexdigest())
+        save_state(http_path, {
+            "url": csv_url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        })
+    print(f"Downloaded ZHVI to {zhvi_path}")
+    return zhvi_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download raw food inspection and ZHVI data.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only fetch inspections newer than the stored high-water mark")
+    parser.add_argument("--endpoint", default=API_ENDPOINT,
+                        help="Socrata endpoint for the food inspections dataset")
+    parser.add_argument("--page-size", type=int, default=PAGE_LIMIT,
+                        help="rows requested per API page")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="number of pages fetched concurrently")
+    parser.add_argument("--zhvi-url", default=ZHVI_URL,
+                        help="URL of the Zillow ZHVI ZIP-level CSV")
+    parser.add_argument("--date-field", default=DATE_FIELD,
+                        help="inspection date field of the dataset (paging order and high-water mark)")
+    parser.add_argument("--id-field", default=ID_FIELD,
+                        help="inspection id field of the dataset (paging order and de-duplication)")
+    parser.add_argument("--no-zhvi", action="store_true",
+                        help="only fetch the food inspections (e.g. when the ZHVI file is shared)")
+    parser.add_argument("--output-dir", default="data/raw")
+    args = parser.parse_args(argv)
+
+    OUTPUT_DIR = Path(args.output_dir)
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
     # -- Chicago Food Inspections --
-    API_ENDPOINT = "https://data.cityofchicago.org/resource/4ijn-s7e5.json"
-    all_records = []
-    limit = 50000  
-    offset = 0
-
-    while True:
-        params = {
-            "$limit": limit,
-            "$offset": offset,
-            "$order": "inspection_date DESC"
-        }
-        print(f"Fetching records {offset} to {offset + limit}...")
-        resp = requests.get(API_ENDPOINT, params=params)
-        resp.raise_for_status()
-        payload = resp.json()
-    
-        if len(payload) == 0:
-            break
-        
-        all_records.extend(payload)
-        print(f"  Retrieved {len(payload)} records (Total so far: {len(all_records)})")
-
-        if len(payload) < limit:
-            break
-        
-        offset += limit
-    print(f"\nSuccessfully fetched {len(all_records)} total records")
-
-    chicago_food_inspection = pd.json_normalize(all_records)
-
-    food_path = OUTPUT_DIR / "food_inspections.csv"
-    chicago_food_inspection.to_csv(food_path, index=False)
-
-    with open(food_path, "rb") as f:
-        sha = hashlib.sha256(f.read()).hexdigest()
-    with open(OUTPUT_DIR / "food_inspections.sha256", "w", encoding="utf-8") as f:
-        f.write(sha)
+    with step("fetch_food"):
+        food_path = fetch_food_inspections(
+            OUTPUT_DIR,
+            endpoint=args.endpoint,
+            incremental=args.incremental,
+            limit=args.page_size,
+            workers=args.workers,
+            date_field=args.date_field,
+            id_field=args.id_field,
+        )
 
+        write_checksum(food_path)
 
-    # -- ZHVI CSV --
-    csv_url = "https://files.zillowstatic.com/research/public_csvs/zhvi/Zip_zhvi_uc_sfrcondo_tier_0.33_0.67_sm_sa_month.csv?t=1762826225"   # the Zillow URL you used
-    response = requests.get(csv_url)
-    zhvi_path = OUTPUT_DIR / "zhvi.csv"
-    with open(zhvi_path, "wb") as f:
-        f.write(response.content)
 
-    with open(zhvi_path, "rb") as f:
-        sha = hashlib.sha256(f.read()).hexdigest()
-    with open(OUTPUT_DIR / "zhvi.sha256", "w", encoding="utf-8") as f:
-        f.write(sha)
+    # -- ZHVI CSV --
+    if not args.no_zhvi:
+        with step("download_zhvi"):
+            download_zhvi(OUTPUT_DIR, csv_url=args.zhvi_url)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,22 +1,66 @@
 # scripts/02_data_storage.py
 
+import argparse
 from pathlib import Path
 import pandas as pd
 
-def main():
-    RAW_DIR = Path("data/raw")
-    PROCESSED_DIR = Path("data/processed")
-    RESULTS_DIR = Path("results")
+from instrument import step
 
-    
-    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
-    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+CHUNK_SIZE = 100_000
+
+
+def profile_food(path, chunksize=CHUNK_SIZE):
+    # stream only the zip column; memory stays flat no matter how long the history is
+    columns = pd.read_csv(path, nrows=0).columns.tolist()
+    n_rows = 0
+    zips = set()
+    usecols = ["zip"] if "zip" in columns else [columns[0]]
+    for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunksize):
+        n_rows += len(chunk)
+        if "zip" in chunk.columns:
+            zips.update(chunk["zip"].dropna().unique())
+    return {
+        "n_rows": n_rows,
+        "columns": columns,
+        "n_zips": len(zips) if "zip" in columns else None,
+    }
+
+
+def profile_zhvi(path, chunksize=CHUNK_SIZE):
+    # stream only the City column as a category; the hundreds of monthly value
+    # columns are never parsed here
+    columns = pd.read_csv(path, nrows=0).columns.tolist()
+    n_rows = 0
+    city_counts = []
+    if "City" in columns:
+        reader = pd.read_csv(path, usecols=["City"], dtype={"City": "category"}, chunksize=chunksize)
+    else:
+        reader = pd.read_csv(path, usecols=[columns[0]], chunksize=chunksize)
+    for chunk in reader:
+        n_rows += len(chunk)
+        if "City" in chunk.columns:
+            city_counts.append(chunk["City"].value_counts())
+    if city_counts:
+        city_counts = (
+            pd.concat([counts.rename(index=str) for counts in city_counts])
+            .groupby(level=0)
+            .sum()
+            .sort_values(ascending=False, kind="stable")
+            .rename_axis("City")
+            .rename("count")
+        )
+    else:
+        city_counts = None
+    return {"n_rows": n_rows, "columns": columns, "city_counts": city_counts}
 
-    food_path = RAW_DIR / "food_inspections.csv"
-    zhvi_path = RAW_DIR / "zhvi.csv"
 
-    chicago_food_inspection = pd.read_csv(food_path)
-    zhvi = pd.read_csv(zhvi_path)
+def storage_report(food_path, zhvi_path, chunksize=CHUNK_SIZE):
+    with step("profile_food") as s:
+        food_profile = profile_food(food_path, chunksize=chunksize)
+        s.rows = food_profile["n_rows"]
+    with step("profile_zhvi") as s:
+        zhvi_profile = profile_zhvi(zhvi_path, chunksize=chunksize)
+        s.rows = zhvi_profile["n_rows"]
 
     # --- Build storage & organization report text ---
     lines = []
@@ -33,33 +77,38 @@ def main():
     lines.append("  * Raw files:        data/raw/<dataset_name>.csv")
     lines.append("  * Processed files:  data/processed/<dataset_name>_cleaned.csv or integrated_*.csv")
     lines.append("  * Checksums:        matching .sha256 files next to raw/processed data")
+    lines.append("  * Checksum manifest: data/checksums.json (size, mtime and SHA-256 per file)")
     lines.append("  * Results:          results/*.csv, results/*.txt, results/*.png")
     lines.append("")
     lines.append("=== FOOD INSPECTIONS (data/raw/food_inspections.csv) ===")
-    lines.append(f"Total records: {len(chicago_food_inspection)}")
-    lines.append(f"Number of columns: {len(chicago_food_inspection.columns)}")
-    lines.append(f"Columns: {chicago_food_inspection.columns.tolist()}")
+    lines.append(f"Total records: {food_profile['n_rows']}")
+    lines.append(f"Number of columns: {len(food_profile['columns'])}")
+    lines.append(f"Columns: {food_profile['columns']}")
 
-    if "zip" in chicago_food_inspection.columns:
-        lines.append(f"Unique ZIP codes: {chicago_food_inspection['zip'].nunique()}")
+    if food_profile["n_zips"] is not None:
+        lines.append(f"Unique ZIP codes: {food_profile['n_zips']}")
     else:
         lines.append("Unique ZIP codes: N/A (no 'zip' column found)")
 
     lines.append("")
     lines.append("=== ZILLOW ZHVI (data/raw/zhvi.csv) ===")
-    lines.append(f"Total records: {len(zhvi)}")
+    lines.append(f"Total records: {zhvi_profile['n_rows']}")
 
-    if "City" in zhvi.columns:
+    city_counts = zhvi_profile["city_counts"]
+    if city_counts is not None:
         lines.append("Top 5 cities by record count:")
-        lines.append(str(zhvi["City"].value_counts().head()))
-        lines.append(f"Chicago records: {len(zhvi[zhvi['City'] == 'Chicago'])}")
+        lines.append(str(city_counts.head()))
+        lines.append(f"Chicago records: {city_counts.get('Chicago', 0)}")
     else:
         lines.append("City breakdown: N/A (no 'City' column found)")
 
     lines.append("")
+    return lines
 
+
+def write_report(lines, results_dir):
     # --- Write report to results/ ---
-    report_path = RESULTS_DIR / "data_storage_summary.txt"
+    report_path = Path(results_dir) / "data_storage_summary.txt"
     with open(report_path, "w", encoding="utf-8") as f:
         for line in lines:
             f.write(str(line) + "\n")
@@ -67,5 +116,23 @@ def main():
     print("\n".join(lines))
     print(f"\n[INFO] Storage summary written to {report_path}")
 
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize the raw datasets and the storage layout.")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE,
+                        help="rows read at a time while profiling the raw CSVs")
+    args = parser.parse_args(argv)
+
+    RAW_DIR = Path("data/raw")
+    PROCESSED_DIR = Path("data/processed")
+    RESULTS_DIR = Path("results")
+
+    
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+
+    lines = storage_report(RAW_DIR / "food_inspections.csv", RAW_DIR / "zhvi.csv", chunksize=args.chunksize)
+    write_report(lines, RESULTS_DIR)
+
 if __name__ == "__main__":
     main()
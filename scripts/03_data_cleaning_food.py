@@ -1,27 +1,85 @@
 # scripts/03_data_cleaning_food.py
 
+import argparse
+import numpy as np
 import pandas as pd
-import hashlib
 from pathlib import Path
 
-def main():
-    RAW_DIR = Path("data/raw")
-    PROCESSED_DIR = Path("data/processed")
-    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+from checksums import write_checksum
+from establishments import establishment_key, latest_per_establishment
+from instrument import step
+from schema import clean_zip_strings, encode_food
+from spatial import DEFAULT_MAX_KM, ZipIndex, centroids_from_points, check_zips, read_centroids
+from storage import write_table
 
-    chicago_food_inspection = pd.read_csv(RAW_DIR / "food_inspections.csv")
+DESCRIPTION = "Clean the raw food inspections: one row per establishment with valid ZIPs."
 
-    food_cleaned = chicago_food_inspection.copy()
-    food_cleaned = food_cleaned.dropna()
+COLUMNS_TO_KEEP = [
+    "inspection_id",
+    "dba_name",
+    "aka_name",
+    "license_",
+    "facility_type",
+    "risk",
+    "address",
+    "city",
+    "state",
+    "zip",
+    "inspection_date",
+    "inspection_type",
+    "results",
+    "violations",
+    "latitude",
+    "longitude",
+]
 
-    # --- convert inspection_date to datetime ---
+
+def map_columns(df, columns=None, risk_values=None):
+    # columns: {pipeline column: column in the raw file}, for inspection datasets
+    # that do not use the Chicago names; risk_values maps the dataset's risk
+    # labels onto schema.RISK_LEVELS (unmapped labels are kept as they are)
+    if columns:
+        df = pd.DataFrame({name: df[source] for name, source in columns.items()})
+    if risk_values:
+        df["risk"] = df["risk"].replace(risk_values)
+    return df
+
+
+def read_raw(raw_path, columns=None, risk_values=None, chunksize=None):
+    # -> DataFrame, or an iterator of DataFrames with chunksize; with a column
+    # mapping only the mapped columns are read
+    usecols = list(dict.fromkeys(columns.values())) if columns else None
+    reader = pd.read_csv(raw_path, usecols=usecols, chunksize=chunksize)
+    if chunksize is None:
+        return map_columns(reader, columns, risk_values)
+    return (map_columns(chunk, columns, risk_values) for chunk in reader)
+
+
+def parse_dates(food_cleaned):
     food_cleaned["inspection_date"] = pd.to_datetime(
         food_cleaned["inspection_date"], errors="coerce"
     )
     invalid_dates = food_cleaned["inspection_date"].isnull().sum()
     if invalid_dates > 0:
-        print(f"Removing {invalid_dates} records with invalid dates...")
         food_cleaned = food_cleaned.dropna(subset=["inspection_date"])
+    return food_cleaned, invalid_dates
+
+
+def drop_incomplete(df, keep_missing_zip=False):
+    # rows with a missing value are dropped; with keep_missing_zip a missing ZIP
+    # is left for the spatial check to fill in from latitude/longitude
+    required = [col for col in df.columns if not (keep_missing_zip and col == "zip")]
+    return df.dropna(subset=required)
+
+
+def latest_inspections(raw_path, columns=None, risk_values=None, keep_missing_zip=False):
+    # dropna already returns a new frame, so no separate copy of the raw table
+    food_cleaned = drop_incomplete(read_raw(raw_path, columns, risk_values), keep_missing_zip)
+
+    # --- convert inspection_date to datetime ---
+    food_cleaned, invalid_dates = parse_dates(food_cleaned)
+    if invalid_dates > 0:
+        print(f"Removing {invalid_dates} records with invalid dates...")
     print(
         f"Date range: {food_cleaned['inspection_date'].min()} "
         f"to {food_cleaned['inspection_date'].max()}"
@@ -29,40 +87,109 @@ def main():
 
     # --- keep only the latest inspection for each establishment ---
     print("\nIdentifying establishments by:")
-    print(f"  - DBA name: {food_cleaned['dba_name'].nunique():,} unique")
+    if "dba_name" in food_cleaned.columns:
+        print(f"  - DBA name: {food_cleaned['dba_name'].nunique():,} unique")
     print(f"  - License number: {food_cleaned['license_'].nunique():,} unique")
     print(f"  - Address: {food_cleaned['address'].nunique():,} unique")
 
-    # Create a unique establishment ID based on license + address (as strings)
-    food_cleaned["establishment_id"] = (
-        food_cleaned["license_"].fillna("UNKNOWN").astype(str)
-        + "_"
-        + food_cleaned["address"].fillna("UNKNOWN").astype(str)
-    )
+    # Identify establishments by license + address as integer codes
+    establishment_ids = establishment_key(food_cleaned)
 
     print(f"\nTotal inspection records before: {len(food_cleaned):,}")
-    print(f"Unique establishments: {food_cleaned['establishment_id'].nunique():,}")
-
-    # Sort by inspection date (most recent first) and keep first record per establishment
-    food_cleaned = (
-        food_cleaned
-        .sort_values("inspection_date", ascending=False)
-        .groupby("establishment_id", as_index=False)
-        .first()
+    print(f"Unique establishments: {len(np.unique(establishment_ids)):,}")
+
+    # Keep the most recent inspection per establishment
+    return latest_per_establishment(food_cleaned, key=establishment_ids)
+
+
+def latest_inspections_chunked(raw_path, chunksize, columns=None, risk_values=None,
+                               keep_missing_zip=False):
+    # Stream the raw file and keep a running "latest per establishment" table,
+    # so peak memory is bounded by the number of establishments plus one chunk
+    # instead of the whole inspection history. Rows are cleaned the same way as
+    # the in-memory path; ZIP filtering still happens after de-duplication.
+    latest = None
+    total_rows = 0
+    total_invalid_dates = 0
+    for i, chunk in enumerate(read_raw(raw_path, columns, risk_values, chunksize=chunksize)):
+        chunk = drop_incomplete(chunk, keep_missing_zip)
+        chunk, invalid_dates = parse_dates(chunk)
+        total_invalid_dates += invalid_dates
+        total_rows += len(chunk)
+        chunk = chunk[[col for col in COLUMNS_TO_KEEP if col in chunk.columns]]
+
+        # earlier rows come first, so date ties keep the earliest row as in
+        # the in-memory path
+        combined = chunk if latest is None else pd.concat([latest, chunk], ignore_index=True)
+        latest = latest_per_establishment(combined)
+        print(f"  Chunk {i + 1}: {total_rows:,} inspections read, {len(latest):,} establishments so far")
+
+    if total_invalid_dates > 0:
+        print(f"Removed {total_invalid_dates} records with invalid dates")
+    print(f"\nTotal inspection records before: {total_rows:,}")
+    print(f"Unique establishments: {len(latest):,}")
+    return latest
+
+
+def spatial_zip_check(food_cleaned, valid_zip, centroids_path=None, max_km=DEFAULT_MAX_KM):
+    # fill in missing or malformed ZIPs from latitude/longitude and count reported ZIPs that
+    # are far from their centroid; centroids come from centroids_path when one
+    # is given, otherwise from the establishments with a valid ZIP
+    if not {"latitude", "longitude"} <= set(food_cleaned.columns):
+        print("No latitude/longitude columns; skipping the spatial ZIP check")
+        return food_cleaned["zip"], valid_zip
+    if centroids_path:
+        centroids = read_centroids(centroids_path)
+        source = str(centroids_path)
+    else:
+        centroids = centroids_from_points(
+            food_cleaned["zip"][valid_zip], food_cleaned["latitude"][valid_zip],
+            food_cleaned["longitude"][valid_zip],
+        )
+        source = "median location of each reported ZIP"
+    if centroids.empty:
+        print("No ZIP centroids available; skipping the spatial ZIP check")
+        return food_cleaned["zip"], valid_zip
+
+    zips, valid_zip, report = check_zips(
+        food_cleaned["zip"], valid_zip, food_cleaned["latitude"], food_cleaned["longitude"],
+        ZipIndex(centroids), max_km=max_km,
     )
-    # Drop helper column
-    food_cleaned = food_cleaned.drop(columns=["establishment_id"])
+    print(f"Spatial ZIP check against {len(centroids)} centroids ({source}):")
+    print(f"  Reported ZIPs valid: {report['reported_valid']:,} "
+          f"({report['matches_nearest']:,} match the nearest centroid)")
+    print(f"  Reported ZIPs more than {max_km:g} km from their centroid: {report['suspect']:,}")
+    print(f"  Reported ZIPs without a centroid: {report['no_centroid']:,}")
+    print(f"  Missing or malformed ZIPs assigned from coordinates: {report['assigned']:,}")
+    print(f"  Missing or malformed ZIPs left unassigned: {report['unassigned']:,}")
+    return zips, valid_zip
+
+
+def clean_food(raw_path, chunksize=None, spatial_zips=True, centroids_path=None,
+               max_km=DEFAULT_MAX_KM, columns=None, risk_values=None):
+    # -> one row per establishment with a valid ZIP, in the encodings of schema.py
+    # (columns / risk_values: see map_columns)
+    with step("parse_dedup") as s:
+        if chunksize:
+            food_cleaned = latest_inspections_chunked(raw_path, chunksize, columns, risk_values,
+                                                      keep_missing_zip=spatial_zips)
+        else:
+            food_cleaned = latest_inspections(raw_path, columns, risk_values,
+                                              keep_missing_zip=spatial_zips)
+        s.rows = len(food_cleaned)
     print("\nKept only the latest inspection per establishment")
 
     # --- clean ZIP codes ---
-    food_cleaned["zip"] = food_cleaned["zip"].astype(str).str[:5]
-    food_cleaned["zip"] = food_cleaned["zip"].str.replace(r"\D", "", regex=True)
-
-    initial_count = len(food_cleaned)
-    food_cleaned = food_cleaned[
-        (food_cleaned["zip"].str.len() == 5)
-        & (~food_cleaned["zip"].str.startswith("000"))
-    ]
+    with step("clean_zip") as s:
+        food_cleaned["zip"], valid_zip = clean_zip_strings(food_cleaned["zip"])
+        if spatial_zips:
+            food_cleaned["zip"], valid_zip = spatial_zip_check(
+                food_cleaned, valid_zip, centroids_path, max_km
+            )
+
+        initial_count = len(food_cleaned)
+        food_cleaned = food_cleaned[valid_zip]
+        s.rows = len(food_cleaned)
     removed = initial_count - len(food_cleaned)
     print(f"Removed {removed} records with invalid ZIP codes")
     print(f"Remaining records: {len(food_cleaned):,}")
@@ -71,27 +198,13 @@ def main():
     print("\nSample ZIP codes:")
     print(food_cleaned["zip"].value_counts().head(10))
 
-    columns_to_keep = [
-        "inspection_id",
-        "dba_name",
-        "aka_name",
-        "license_",
-        "facility_type",
-        "risk",
-        "address",
-        "city",
-        "state",
-        "zip",
-        "inspection_date",
-        "inspection_type",
-        "results",
-        "violations",
-        "latitude",
-        "longitude",
-    ]
-    available_columns = [col for col in columns_to_keep if col in food_cleaned.columns]
+    available_columns = [col for col in COLUMNS_TO_KEEP if col in food_cleaned.columns]
     food_cleaned = food_cleaned[available_columns].copy()
 
+    # --- compact encodings: int32 ZIP codes, categorical risk/facility/result ---
+    with step("encode", rows=len(food_cleaned)):
+        food_cleaned = encode_food(food_cleaned)
+
     print("=== CLEANED DATA SUMMARY ===\n")
     print(f"Total records: {len(food_cleaned):,}")
     print(f"Unique establishments (one per row): {len(food_cleaned):,}")
@@ -104,28 +217,57 @@ def main():
     print("\nRisk distribution:")
     print(food_cleaned["risk"].value_counts())
 
-    print("\nInspection results distribution:")
-    print(food_cleaned["results"].value_counts().head(10))
+    # results and facility_type are optional in a column mapping
+    if "results" in food_cleaned.columns:
+        print("\nInspection results distribution:")
+        print(food_cleaned["results"].value_counts().head(10))
 
-    print("\nTop facility types:")
-    print(food_cleaned["facility_type"].value_counts().head(10))
+    if "facility_type" in food_cleaned.columns:
+        print("\nTop facility types:")
+        print(food_cleaned["facility_type"].value_counts().head(10))
 
     print("\nMissing values:")
     missing = food_cleaned.isnull().sum()
     print(missing[missing > 0])
 
+    return food_cleaned
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--csv", action="store_true",
+                        help="also write a CSV copy of the output next to the Parquet file")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="stream the raw file in chunks of this many rows "
+                             "instead of loading it all at once")
+    parser.add_argument("--no-spatial-zips", action="store_true",
+                        help="drop malformed ZIPs instead of assigning them from latitude/longitude")
+    parser.add_argument("--zip-centroids", default=None,
+                        help="ZIP centroid file (zip/latitude/longitude or Census gazetteer "
+                             "columns); by default centroids come from the inspections")
+    parser.add_argument("--max-km", type=float, default=DEFAULT_MAX_KM,
+                        help="largest distance to a ZIP centroid that is trusted")
+    args = parser.parse_args(argv)
+
+    RAW_DIR = Path("data/raw")
+    PROCESSED_DIR = Path("data/processed")
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+
+    food_cleaned = clean_food(
+        RAW_DIR / "food_inspections.csv",
+        chunksize=args.chunksize,
+        spatial_zips=not args.no_spatial_zips,
+        centroids_path=args.zip_centroids,
+        max_km=args.max_km,
+    )
+
     # --- write outputs ---
-    output_file = PROCESSED_DIR / "food_inspections_cleaned.csv"
-    food_cleaned.to_csv(output_file, index=False)
-
-    with open(output_file, "rb") as f:
-        sha = hashlib.sha256(f.read()).hexdigest()
-    with open(
-        PROCESSED_DIR / "food_inspections_cleaned.sha256",
-        "w",
-        encoding="utf-8",
-    ) as f:
-        f.write(sha)
+    with step("write", rows=len(food_cleaned)):
+        output_file = write_table(
+            food_cleaned, PROCESSED_DIR / "food_inspections_cleaned", csv_copy=args.csv
+        )
+
+        write_checksum(output_file)
 
 if __name__ == "__main__":
     main()
@@ -1,74 +1,114 @@
 # scripts/03_data_cleaning_zhvi.py
 
-import pandas as pd
-import hashlib
+import argparse
+import numpy as np
 from pathlib import Path
 
-def main():
-    RAW_DIR = Path("data/raw")
-    PROCESSED_DIR = Path("data/processed")
-    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+from checksums import write_checksum
+from instrument import step
+from storage import read_table, write_table
+from zhvi import read_zhvi, to_long, to_wide
 
-    zhvi = pd.read_csv(RAW_DIR / "zhvi.csv")
+DESCRIPTION = "Clean the raw ZHVI file: drop ZIPs with mostly missing or stale values."
 
+def clean_zhvi(raw_path, geography=None, zips=None):
+    # -> (metadata indexed by RegionName, float32 values, month labels) for the
+    # ZIPs that pass the missing-data filters
 
-    zhvi_cleaned = zhvi.copy()
+    # month columns are parsed once and held as a float32 matrix keyed by RegionName
+    with step("parse") as s:
+        meta, values, date_columns = read_zhvi(raw_path, geography=geography, zips=zips)
+        s.rows = len(meta)
 
     print("\n=== IDENTIFYING DATE COLUMNS ===")
-    all_columns = zhvi_cleaned.columns.tolist()
-    date_columns = [col for col in all_columns if isinstance(col, str) and '-' in col and len(col) == 10]
-    metadata_columns = [col for col in all_columns if col not in date_columns]
     print(f"Total date columns: {len(date_columns)}")
     print(f"Date range: {date_columns[0]} to {date_columns[-1]}")
-    print(f"Metadata columns: {metadata_columns}")
+    print(f"Metadata columns: {meta.columns.tolist()}")
 
     print("\n=== HANDLING MISSING VALUES ===")
 
-    # Check missing values in date columns
-    missing_per_row = zhvi_cleaned[date_columns].isnull().sum(axis=1)
+    # one missing-value mask serves both filters
+    missing = np.isnan(values)
+    missing_per_row = missing.sum(axis=1)
+    recent_missing = missing[:, -12:].sum(axis=1)
     print(f"Missing value statistics per ZIP code:")
     print(f"  Mean missing: {missing_per_row.mean():.1f} months")
-    print(f"  Median missing: {missing_per_row.median():.0f} months")
+    print(f"  Median missing: {np.median(missing_per_row):.0f} months")
     print(f"  Max missing: {missing_per_row.max():.0f} months")
 
     # remove ZIP codes with >80% missing values
     threshold = len(date_columns) * 0.8
-    initial_count = len(zhvi_cleaned)
-    zhvi_cleaned = zhvi_cleaned[missing_per_row <= threshold]
-    removed = initial_count - len(zhvi_cleaned)
-    print(f"\nRemoved {removed} ZIP codes with >80% missing values")
-    print(f"Remaining ZIP codes: {len(zhvi_cleaned):,}")
+    mostly_complete = missing_per_row <= threshold
+    print(f"\nRemoved {(~mostly_complete).sum()} ZIP codes with >80% missing values")
+    print(f"Remaining ZIP codes: {mostly_complete.sum():,}")
 
 
     print("\n=== REMOVING ZIP CODES WITH NO RECENT DATA ===")
     recent_months = date_columns[-12:]
     print(f"Checking recent months: {recent_months[0]} to {recent_months[-1]}")
 
-    # Count missing values in recent 12 months
-    recent_missing = zhvi_cleaned[recent_months].isnull().sum(axis=1)
-
     # Remove ZIP codes with no data in all 12 recent months
-    initial_count = len(zhvi_cleaned)
-    zhvi_cleaned = zhvi_cleaned[recent_missing < 12]
-    removed = initial_count - len(zhvi_cleaned)
-    print(f"Removed {removed} ZIP codes with NO data in recent 12 months")
-    print(f"Remaining ZIP codes: {len(zhvi_cleaned):,}")
+    has_recent = recent_missing < 12
+    keep = mostly_complete & has_recent
+    print(f"Removed {(mostly_complete & ~has_recent).sum()} ZIP codes with NO data in recent 12 months")
+    print(f"Remaining ZIP codes: {keep.sum():,}")
+
+    meta = meta[keep]
+    values = values[keep]
 
     print("\n=== FINAL DATA SUMMARY ===")
 
-    print(f"\nTotal ZIP codes: {len(zhvi_cleaned):,}")
-    print(f"Total columns: {len(zhvi_cleaned.columns)}")
+    print(f"\nTotal ZIP codes: {len(meta):,}")
+    print(f"Total columns: {len(meta.columns) + len(date_columns)}")
     print(f"Date coverage: {date_columns[0]} to {date_columns[-1]}")
 
-    
+    return meta, values, date_columns
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--csv", action="store_true",
+                        help="also write a CSV copy of the output next to the Parquet file")
+    parser.add_argument("--long", action="store_true",
+                        help="also write a long (zip, month, zhvi) table to data/processed/zhvi_long.parquet")
+    parser.add_argument("--city", action="append", default=[],
+                        help="only keep ZHVI rows for this City (repeatable)")
+    parser.add_argument("--state", action="append", default=[],
+                        help="only keep ZHVI rows for this State, e.g. IL (repeatable)")
+    parser.add_argument("--metro", action="append", default=[],
+                        help="only keep ZHVI rows for this Metro (repeatable)")
+    parser.add_argument("--zips-from-food", action="store_true",
+                        help="only keep ZIPs that appear in data/processed/food_inspections_cleaned")
+    args = parser.parse_args(argv)
 
-    output_file = PROCESSED_DIR / "zhvi_cleaned.csv"
-    zhvi_cleaned.to_csv(output_file, index=False)
+    RAW_DIR = Path("data/raw")
+    PROCESSED_DIR = Path("data/processed")
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
 
-    with open(output_file, "rb") as f:
-        sha = hashlib.sha256(f.read()).hexdigest()
-    with open(PROCESSED_DIR / "zhvi_cleaned.sha256", "w", encoding="utf-8") as f:
-        f.write(sha)
+    # rows outside the configured geography are skipped while parsing
+    geography = {"City": args.city, "State": args.state, "Metro": args.metro}
+    zips = None
+    if args.zips_from_food:
+        zips = read_table(PROCESSED_DIR / "food_inspections_cleaned", columns=["zip"])["zip"].unique()
+    scope = [f"{col} in {values}" for col, values in geography.items() if values]
+    if zips is not None:
+        scope.append(f"{len(zips)} ZIPs from the cleaned food data")
+    if scope:
+        print(f"Geography filter: {'; '.join(scope)}")
+
+    meta, values, date_columns = clean_zhvi(RAW_DIR / "zhvi.csv", geography=geography, zips=zips)
+
+    with step("write", rows=len(meta)):
+        zhvi_cleaned = to_wide(meta, values, date_columns)
+        output_file = write_table(zhvi_cleaned, PROCESSED_DIR / "zhvi_cleaned", csv_copy=args.csv)
+
+        write_checksum(output_file)
+
+    if args.long:
+        zhvi_long = to_long(meta, values, date_columns)
+        long_file = write_table(zhvi_long, PROCESSED_DIR / "zhvi_long", csv_copy=args.csv)
+        write_checksum(long_file)
+        print(f"Long ZHVI table: {len(zhvi_long):,} (zip, month) rows written to {long_file}")
 
 if __name__ == "__main__":
     main()
@@ -1,13 +1,27 @@
 # scripts/04_data_integration.py
+import argparse
 import pandas as pd
-import hashlib
 from pathlib import Path
 
-def main():
-    PROCESSED_DIR = Path("data/processed")
-    RESULTS_DIR = Path("results")
-    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
-    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+from checksums import cached_sha256, write_checksum
+from instrument import step
+from schema import zip_codes
+from storage import read_table, table_columns, table_path, write_table
+from violations import matrix_name, save_violations, violation_matrix
+from zhvi import load_aggregates, window_mean
+from zip_summary import zip_summary
+
+DESCRIPTION = "Join cleaned food inspections with ZIP-level ZHVI summaries."
+
+# the only ZHVI metadata the integration needs; the monthly values come from
+# the prefix-sum aggregates
+ZHVI_METADATA_COLUMNS = ["RegionName", "City", "State", "Metro", "CountyName"]
+
+def integrate(food_cleaned, zhvi_meta, aggregates, recent_start="2020-01-01", recent_end=None,
+              normalized=False):
+    # food_cleaned: cleaned establishments; zhvi_meta: ZHVI metadata columns in
+    # the row order of `aggregates` (see zhvi.build_aggregates).
+    # -> ({table name: DataFrame}, summary lines)
 
     # collect printed lines for a summary file
     lines = []
@@ -15,28 +29,18 @@ def main():
         print(msg)
         lines.append(str(msg))
 
-    # --- load cleaned inputs ---
-    food_cleaned = pd.read_csv(PROCESSED_DIR / "food_inspections_cleaned.csv")
-    zhvi_cleaned = pd.read_csv(PROCESSED_DIR / "zhvi_cleaned.csv")
-
-    # --- prep ZHVI data ---
-    zhvi_cleaned = zhvi_cleaned.rename(columns={"RegionName": "zip"})
-
-    food_cleaned["zip"] = food_cleaned["zip"].astype(str)
-    zhvi_cleaned["zip"] = zhvi_cleaned["zip"].astype(str)
-
-    date_columns = [
-        col for col in zhvi_cleaned.columns
-        if isinstance(col, str) and "-" in col and len(col) == 10
-    ]
+    date_columns = aggregates["months"]
     log(f"\nZHVI date columns: {len(date_columns)} (from {date_columns[0]} to {date_columns[-1]})")
 
-    zhvi_cleaned["avg_zhvi_all_time"] = zhvi_cleaned[date_columns].mean(axis=1)
+    zhvi_cleaned = zhvi_meta.rename(columns={"RegionName": "zip"})
 
-    recent_date_cols = [col for col in date_columns if col >= "2020-01-01"]
-    zhvi_cleaned["avg_zhvi_recent"] = zhvi_cleaned[recent_date_cols].mean(axis=1)
+    # both sides join on int32 ZIP codes (already int32 in the cleaned food table)
+    food_cleaned = food_cleaned.assign(zip=zip_codes(food_cleaned["zip"]))
+    zhvi_cleaned["zip"] = zip_codes(zhvi_cleaned["zip"])
 
-    zhvi_cleaned["zhvi_latest"] = zhvi_cleaned[date_columns[-1]]
+    zhvi_cleaned["avg_zhvi_all_time"] = window_mean(aggregates)
+    zhvi_cleaned["avg_zhvi_recent"] = window_mean(aggregates, start=recent_start, end=recent_end)
+    zhvi_cleaned["zhvi_latest"] = aggregates["latest"]
     latest_date = date_columns[-1]  # not used further, but nice to keep
 
     housing_columns = [
@@ -67,26 +71,37 @@ def main():
     log(f"  Housing ZIPs not in food: {len(housing_zips - food_zips)}")
 
     # --- integrate ---
-    integrated_data = pd.merge(
-        food_cleaned,
-        zhvi_for_merge,
-        on="zip",
-        how="inner",
-        suffixes=("_food", "_housing"),
-    )
+    if normalized:
+        # establishment fact table + ZIP dimension table; the housing columns are
+        # stored once per ZIP instead of once per establishment
+        establishments = food_cleaned[food_cleaned["zip"].isin(common_zips)]
+        zip_housing = zhvi_for_merge[zhvi_for_merge["zip"].isin(common_zips)]
+        n_columns = len(establishments.columns) + len(zip_housing.columns) - 1
+    else:
+        integrated_data = pd.merge(
+            food_cleaned,
+            zhvi_for_merge,
+            on="zip",
+            how="inner",
+            suffixes=("_food", "_housing"),
+        )
+        establishments = integrated_data
+        n_columns = len(integrated_data.columns)
+    # latest ZHVI per establishment (one column, looked up by ZIP)
+    zhvi_latest = establishments["zip"].map(zhvi_for_merge.set_index("zip")["zhvi_latest"])
 
     log(f"\nIntegration complete!")
-    log(f"Integrated records: {len(integrated_data):,}")
-    log(f"Integrated ZIP codes: {integrated_data['zip'].nunique()}")
+    log(f"Integrated records: {len(establishments):,}")
+    log(f"Integrated ZIP codes: {establishments['zip'].nunique()}")
 
     # --- post-integration analysis ---
     log("\n=== POST-INTEGRATION ANALYSIS ===")
     log(f"\nIntegrated Dataset:")
-    log(f"  Total establishments: {len(integrated_data):,}")
-    log(f"  Unique ZIP codes: {integrated_data['zip'].nunique()}")
-    log(f"  Columns: {len(integrated_data.columns)}")
+    log(f"  Total establishments: {len(establishments):,}")
+    log(f"  Unique ZIP codes: {establishments['zip'].nunique()}")
+    log(f"  Columns: {n_columns}")
 
-    establishments_per_zip = integrated_data.groupby("zip").size()
+    establishments_per_zip = establishments.groupby("zip").size()
     log(f"\nEstablishments per ZIP code:")
     log(f"  Mean: {establishments_per_zip.mean():.1f}")
     log(f"  Median: {establishments_per_zip.median():.0f}")
@@ -94,33 +109,126 @@ def main():
     log(f"  Max: {establishments_per_zip.max()}")
 
     log(f"\nRisk distribution in integrated data:")
-    log(integrated_data["risk"].value_counts())
+    risk_counts = establishments["risk"].value_counts()
+    log(risk_counts[risk_counts > 0])
 
     log(f"\nHousing value statistics (latest ZHVI):")
-    log(f"  Mean: ${integrated_data['zhvi_latest'].mean():,.0f}")
-    log(f"  Median: ${integrated_data['zhvi_latest'].median():,.0f}")
-    log(f"  Min: ${integrated_data['zhvi_latest'].min():,.0f}")
-    log(f"  Max: ${integrated_data['zhvi_latest'].max():,.0f}")
-
-    log(f"\nTop 5 facility types in integrated data:")
-    log(integrated_data["facility_type"].value_counts().head())
-
-    # --- write integrated dataset ---
-    output_file = PROCESSED_DIR / "integrated_food_housing.csv"
-    integrated_data.to_csv(output_file, index=False)
-
-    with open(output_file, "rb") as f:
-        sha = hashlib.sha256(f.read()).hexdigest()
-    with open(PROCESSED_DIR / "integrated_food_housing.sha256", "w", encoding="utf-8") as f:
-        f.write(sha)
-
+    log(f"  Mean: ${zhvi_latest.mean():,.0f}")
+    log(f"  Median: ${zhvi_latest.median():,.0f}")
+    log(f"  Min: ${zhvi_latest.min():,.0f}")
+    log(f"  Max: ${zhvi_latest.max():,.0f}")
+
+    if "facility_type" in establishments.columns:
+        log(f"\nTop 5 facility types in integrated data:")
+        facility_counts = establishments["facility_type"].value_counts()
+        log(facility_counts[facility_counts > 0].head())
+
+    if normalized:
+        tables = {
+            "integrated_establishments": establishments,
+            "zip_housing": zip_housing,
+            "zip_risk_summary": zip_summary(establishments, zip_housing),
+        }
+    else:
+        tables = {"integrated_food_housing": integrated_data}
+    return tables, lines
+
+
+def split_violations(tables, keep_text=False):
+    # parse the violation codes of the establishment table into a sparse
+    # matrix and drop the free text (unless keep_text)
+    # -> (tables, CSR matrix or None, inspection_id of each matrix row)
+    name = "integrated_establishments" if "integrated_establishments" in tables else "integrated_food_housing"
+    establishments = tables[name]
+    if "violations" not in establishments.columns:
+        return tables, None, None
+
+    matrix = violation_matrix(establishments["violations"])
+    text_mb = establishments["violations"].str.len().sum() / (1024 * 1024)
+    matrix_mb = (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / (1024 * 1024)
+    print(f"\nViolation codes: {matrix.nnz:,} citations of {matrix.shape[1] - 1} codes "
+          f"across {matrix.shape[0]:,} establishments")
+    print(f"  Text: {text_mb:.1f} MB -> sparse matrix: {matrix_mb:.1f} MB")
+    if not keep_text:
+        tables = {**tables, name: establishments.drop(columns=["violations"])}
+    return tables, matrix, establishments["inspection_id"].to_numpy()
+
+
+def write_summary(lines, results_dir):
     # --- write summary text file ---
-    summary_path = RESULTS_DIR / "integrated_data_summary.txt"
+    summary_path = Path(results_dir) / "integrated_data_summary.txt"
     with open(summary_path, "w", encoding="utf-8") as f:
         for line in lines:
             f.write(str(line) + "\n")
 
-    log(f"\n[INFO] Integration summary written to {summary_path}")
+    print(f"\n[INFO] Integration summary written to {summary_path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--csv", action="store_true",
+                        help="also write a CSV copy of the output next to the Parquet file")
+    parser.add_argument("--recent-start", default="2020-01-01",
+                        help="first month (YYYY-MM-DD) of the avg_zhvi_recent window")
+    parser.add_argument("--recent-end", default=None,
+                        help="last month (YYYY-MM-DD) of the avg_zhvi_recent window (default: latest)")
+    parser.add_argument("--normalized", action="store_true",
+                        help="write an establishment table, a ZIP housing table and a ZIP-level risk "
+                             "summary instead of the joined integrated_food_housing table")
+    parser.add_argument("--keep-violation-text", action="store_true",
+                        help="keep the free-text violations column in the integrated table "
+                             "(the parsed codes are always written to data/processed/<table>_violations.npz)")
+    args = parser.parse_args(argv)
+
+    PROCESSED_DIR = Path("data/processed")
+    RESULTS_DIR = Path("results")
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+
+    # --- load cleaned inputs ---
+    with step("load_food") as s:
+        food_cleaned = read_table(PROCESSED_DIR / "food_inspections_cleaned")
+        s.rows = len(food_cleaned)
+
+    # --- ZIP-level ZHVI summaries from the cached prefix-sum aggregates ---
+    zhvi_path = table_path(PROCESSED_DIR / "zhvi_cleaned")
+    with step("load_zhvi_aggregates") as s:
+        zhvi_sha = cached_sha256(zhvi_path)
+        aggregates, from_cache = load_aggregates(zhvi_path, zhvi_sha, PROCESSED_DIR / "cache")
+        s.rows = len(aggregates["zips"])
+    print(f"ZHVI aggregates {'loaded from cache' if from_cache else 'computed'} (snapshot {zhvi_sha[:12]})")
+
+    metadata_columns = [col for col in ZHVI_METADATA_COLUMNS if col in table_columns(zhvi_path)]
+    zhvi_meta = read_table(zhvi_path, columns=metadata_columns)
+
+    # the aggregates are stored in the row order of the snapshot they came from
+    if not (zhvi_meta["RegionName"].astype(str).to_numpy(dtype=str) == aggregates["zips"]).all():
+        raise ValueError(f"Cached ZHVI aggregates do not match {zhvi_path}; delete {PROCESSED_DIR / 'cache'}")
+
+    with step("merge") as s:
+        tables, lines = integrate(
+            food_cleaned, zhvi_meta, aggregates,
+            recent_start=args.recent_start, recent_end=args.recent_end, normalized=args.normalized,
+        )
+        s.rows = len(next(iter(tables.values())))
+
+    with step("violations") as s:
+        tables, matrix, inspection_ids = split_violations(tables, keep_text=args.keep_violation_text)
+        s.rows = 0 if matrix is None else matrix.shape[0]
+
+    # --- write integrated table(s) ---
+    with step("write", rows=sum(len(table) for table in tables.values())):
+        for name, table in tables.items():
+            output_file = write_table(table, PROCESSED_DIR / name, csv_copy=args.csv)
+            write_checksum(output_file)
+        if matrix is not None:
+            matrix_path = PROCESSED_DIR / matrix_name(
+                "integrated_establishments" if args.normalized else "integrated_food_housing"
+            )
+            save_violations(matrix, inspection_ids, matrix_path)
+            write_checksum(matrix_path)
+
+    write_summary(lines, RESULTS_DIR)
 
 if __name__ == "__main__":
     main()
@@ -1,210 +1,96 @@
 # scripts/05_data_analysis_visualization.py
-
+#
+# Usage:
+#   python scripts/05_data_analysis_visualization.py          # tables + figures
+#   python scripts/05_data_analysis_visualization.py stats    # tables only
+#   python scripts/05_data_analysis_visualization.py plots    # figures only
+#
+# matplotlib and seaborn are only imported (through plots.py) when figures are
+# rendered, so "stats" never pays for them.
+
+import argparse
+import numpy as np
 import pandas as pd
 from pathlib import Path
-import matplotlib.pyplot as plt
-import seaborn as sns
 
+from instrument import step
+from resampling import correlation_significance
+from schema import zip_strings
+from storage import read_table
+from violations import load_violations, matrix_name, zip_violation_rates
+from zip_summary import HOUSING_VALUE_COLUMNS, zip_summary
 
-def main():
-    PROCESSED_DIR = Path("data/processed")
-    RESULTS_DIR = Path("results")
-    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+# the analysis only needs these columns; skipping the free-text ones (violations,
+# names, addresses) keeps the integrated table small in memory
+ANALYSIS_COLUMNS = ["zip", "risk", "avg_zhvi_all_time", "avg_zhvi_recent", "zhvi_latest"]
 
-    integrated_data = pd.read_csv(PROCESSED_DIR / "integrated_food_housing.csv")
+CORR_COLUMNS = [
+    "high_risk_prop",
+    "medium_risk_prop",
+    "low_risk_prop",
+    "avg_zhvi_all_time",
+    "avg_zhvi_recent",
+    "zhvi_latest",
+    "total_inspections",
+]
 
-    risk_counts = (
-        integrated_data
-        .groupby(["zip", "risk"])
-        .size()
-        .reset_index(name="n_inspections")
-    )
+RISK_PROP_COLUMNS = ["high_risk_prop", "medium_risk_prop", "low_risk_prop"]
 
-    risk_pivot = (
-        risk_counts
-        .pivot(index="zip", columns="risk", values="n_inspections")
-        .fillna(0)
-    )
 
-    risk_pivot = risk_pivot.rename(columns={
-        "Risk 1 (High)": "high_risk_count",
-        "Risk 2 (Medium)": "medium_risk_count",
-        "Risk 3 (Low)": "low_risk_count",
-    })
+def load_zip_level(processed_dir, from_zip_summary=False):
+    if from_zip_summary:
+        # already one row per ZIP
+        return read_table(processed_dir / "zip_risk_summary")
 
-    risk_pivot["total_inspections"] = (
-        risk_pivot["high_risk_count"] +
-        risk_pivot["medium_risk_count"] +
-        risk_pivot["low_risk_count"]
+    integrated_data = read_table(
+        processed_dir / "integrated_food_housing", columns=ANALYSIS_COLUMNS
     )
+    return zip_level_from_integrated(integrated_data)
 
-    risk_pivot["high_risk_prop"]   = risk_pivot["high_risk_count"]   / risk_pivot["total_inspections"]
-    risk_pivot["medium_risk_prop"] = risk_pivot["medium_risk_count"] / risk_pivot["total_inspections"]
-    risk_pivot["low_risk_prop"]    = risk_pivot["low_risk_count"]    / risk_pivot["total_inspections"]
 
+def zip_level_from_integrated(integrated_data):
     # attach housing data at ZIP level
     housing_zip = (
         integrated_data
-        .groupby("zip")[["avg_zhvi_all_time", "avg_zhvi_recent", "zhvi_latest"]]
+        .groupby("zip")[HOUSING_VALUE_COLUMNS]
         .mean()
         .reset_index()
     )
 
-    zip_level = (
-        risk_pivot
-        .reset_index()
-        .merge(housing_zip, on="zip", how="inner")
-    )
-
-    # 1) save table
-    zip_level.to_csv(RESULTS_DIR / "zip_level_summary.csv", index=False)
-
-    # 2) correlation + save to text
-    corr_cols = [
-        "high_risk_prop",
-        "medium_risk_prop",
-        "low_risk_prop",
-        "avg_zhvi_all_time",
-        "avg_zhvi_recent",
-        "zhvi_latest",
-        "total_inspections",
-    ]
-
-    # Compute correlation matrix
-    corr = zip_level[corr_cols].corr()
-
-    # Round to 2 decimals for annotation
-    annot_matrix = corr.round(2)
-
-    plt.figure(figsize=(8, 6))
-    ax = sns.heatmap(
-        corr,
-        cmap="coolwarm",
-        vmin=-1,
-        vmax=1,
-        annot=annot_matrix, 
-        fmt="",              
-        annot_kws={"size": 8, "color": "black"}
-    )
-    ax.set_title("Correlation: risk proportions and housing values (ZIP level)")
-    ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha="right")
-    ax.set_yticklabels(ax.get_yticklabels(), rotation=0)
+    return zip_summary(integrated_data, housing_zip)
 
-    plt.tight_layout()
-    plt.savefig(RESULTS_DIR / "correlation_heatmap.png", dpi=300)
-    plt.close()
 
+def write_stats(zip_level, results_dir, n_resamples=10_000, seed=477, workers=None):
+    # 1) save table, with 5-digit ZIP strings
+    zip_level.assign(zip=zip_strings(zip_level["zip"])).to_csv(
+        results_dir / "zip_level_summary.csv", index=False
+    )
 
-    # Correlations between risk proportions and recent ZHVI
+    # 2) correlations between risk proportions and recent ZHVI + save to text
     r_high = zip_level["high_risk_prop"].corr(zip_level["avg_zhvi_recent"])
     r_low  = zip_level["low_risk_prop"].corr(zip_level["avg_zhvi_recent"])
     r_med  = zip_level["medium_risk_prop"].corr(zip_level["avg_zhvi_recent"])
 
-    with open(RESULTS_DIR / "risk_correlations.txt", "w") as f:
+    with open(results_dir / "risk_correlations.txt", "w") as f:
         f.write("Pearson correlations (computed via pandas.DataFrame.corr)\n")
         f.write(f"High-risk prop vs avg_zhvi_recent: r = {r_high:.3f}\n")
         f.write(f"Low-risk  prop vs avg_zhvi_recent: r = {r_low:.3f}\n")
         f.write(f"Medium-risk prop vs avg_zhvi_recent: r = {r_med:.3f}\n")
 
-
-    # 3) save scatter plot
-    plt.figure()
-    sns.regplot(
-        data=zip_level,
-        x="high_risk_prop",
-        y="avg_zhvi_recent",
-        scatter_kws={"alpha": 0.7},
-        line_kws={"color": "red"}
-    )
-    plt.xlabel("Proportion of high-risk inspections (per ZIP)")
-    plt.ylabel("Average ZHVI (recent years, USD)")
-    plt.title("High-risk share vs housing values")
-    plt.tight_layout()
-    plt.savefig(RESULTS_DIR / "high_risk_vs_zhvi_scatter.png", dpi=300)
-    plt.close()
-
-    plt.figure()
-    sns.regplot(
-        data=zip_level,
-        x="low_risk_prop",
-        y="avg_zhvi_recent",
-        scatter_kws={"alpha": 0.7},
-        line_kws={"color": "green"}
-    )
-    plt.xlabel("Proportion of low-risk inspections (per ZIP)")
-    plt.ylabel("Average ZHVI (recent years, USD)")
-    plt.title("Low-risk share vs housing values")
-    plt.tight_layout()
-    plt.savefig(RESULTS_DIR / "low_risk_vs_zhvi_scatter.png", dpi=300)
-    plt.close()
-
-
-    # Create tertiles (low / medium / high) based on risk proportions
-    zip_level["high_risk_tertile"] = pd.qcut(
-        zip_level["high_risk_prop"],
-        q=3,
-        labels=["Low high-risk", "Medium high-risk", "High high-risk"]
-    )
-
-    zip_level["low_risk_tertile"] = pd.qcut(
-        zip_level["low_risk_prop"],
-        q=3,
-        labels=["Low low-risk", "Medium low-risk", "High low-risk"]
-    )
-
-    # Boxplot: housing by high-risk tertiles
-    plt.figure(figsize=(7, 5))
-    order_high = ["Low high-risk", "Medium high-risk", "High high-risk"]
-    sns.boxplot(
-        data=zip_level,
-        x="high_risk_tertile",
-        y="avg_zhvi_recent",
-        order=order_high
-    )
-    sns.stripplot(
-        data=zip_level,
-        x="high_risk_tertile",
-        y="avg_zhvi_recent",
-        order=order_high,
-        color="black",
-        size=3,
-        alpha=0.5
-    )
-    plt.xlabel("ZIP groups by high-risk proportion")
-    plt.ylabel("Average ZHVI (recent years, USD)")
-    plt.title("Housing values across ZIPs with different high-risk shares")
-    plt.tight_layout()
-    plt.savefig(RESULTS_DIR / "housing_by_high_risk_tertiles.png", dpi=300)
-    plt.close()
-
-    # Boxplot: housing by low-risk tertiles
-    plt.figure(figsize=(7, 5))
-    order_low = ["Low low-risk", "Medium low-risk", "High low-risk"]
-    sns.boxplot(
-        data=zip_level,
-        x="low_risk_tertile",
-        y="avg_zhvi_recent",
-        order=order_low
-    )
-    sns.stripplot(
-        data=zip_level,
-        x="low_risk_tertile",
-        y="avg_zhvi_recent",
-        order=order_low,
-        color="black",
-        size=3,
-        alpha=0.5
-    )
-    plt.xlabel("ZIP groups by low-risk proportion")
-    plt.ylabel("Average ZHVI (recent years, USD)")
-    plt.title("Housing values across ZIPs with different low-risk shares")
-    plt.tight_layout()
-    plt.savefig(RESULTS_DIR / "housing_by_low_risk_tertiles.png", dpi=300)
-    plt.close()
-
-
-    # risk proportions by housing price quartile
-    zip_level["zhvi_quartile"] = pd.qcut(
+    # bootstrap CIs and permutation p-values for every risk proportion vs
+    # housing value pair
+    if n_resamples > 0:
+        with step("resampling", rows=n_resamples):
+            significance = correlation_significance(
+                zip_level, RISK_PROP_COLUMNS, HOUSING_VALUE_COLUMNS,
+                n_resamples=n_resamples, seed=seed, workers=workers,
+            )
+        significance.to_csv(results_dir / "risk_correlation_significance.csv", index=False)
+        print(f"Correlation significance ({n_resamples:,} resamples, seed {seed}):")
+        print(significance.round(4).to_string(index=False))
+
+    # 3) risk proportions by housing price quartile
+    zhvi_quartile = pd.qcut(
         zip_level["avg_zhvi_recent"],
         q=4,
         labels=["Q1 (lowest)", "Q2", "Q3", "Q4 (highest)"]
@@ -212,6 +98,7 @@ def main():
 
     risk_by_price = (
         zip_level
+        .assign(zhvi_quartile=zhvi_quartile)
         .groupby("zhvi_quartile")[["high_risk_prop", "low_risk_prop", "medium_risk_prop"]]
         .mean()
         .reindex(["Q1 (lowest)", "Q2", "Q3", "Q4 (highest)"])
@@ -219,8 +106,94 @@ def main():
 
     print("Average risk proportions by housing price quartile:")
     print(risk_by_price)
-    risk_by_price.to_csv(RESULTS_DIR / "risk_by_price_quartiles.csv")
+    risk_by_price.to_csv(results_dir / "risk_by_price_quartiles.csv")
+
+
+def violation_table(from_zip_summary=False):
+    # the establishment table whose violation matrix the analysis reads
+    return "integrated_establishments" if from_zip_summary else "integrated_food_housing"
+
+
+def violation_rates(processed_dir, from_zip_summary=False):
+    # per-ZIP violation rates from the sparse matrix written by stage 04; its
+    # rows follow the establishment table it was parsed from
+    table = violation_table(from_zip_summary)
+    matrix, inspection_ids = load_violations(processed_dir / matrix_name(table))
+    establishments = read_table(processed_dir / table, columns=["inspection_id", "zip"])
+    if not np.array_equal(establishments["inspection_id"].to_numpy(), inspection_ids):
+        raise ValueError(f"{matrix_name(table)} does not match {table}; re-run 04_data_integration.py")
+    return zip_violation_rates(matrix, establishments["zip"].to_numpy())
+
+
+def write_violation_rates(rates, results_dir):
+    rates.assign(zip=zip_strings(rates["zip"])).to_csv(results_dir / "zip_violation_rates.csv", index=False)
+
+    overall = rates.groupby("violation_code")[["cited", "establishments"]].sum()
+    overall["rate"] = overall["cited"] / overall["establishments"]
+    print("Most frequently cited violation codes (share of establishments):")
+    print(overall["rate"].sort_values(ascending=False).head(10).round(3).to_string())
+
+
+def write_figures(zip_level, results_dir, workers=None, force=False, cache_dir=None):
+    # cache_dir: where rendered PNGs are kept (default plots.FIGURE_CACHE_DIR)
+    with step("import_plotting") as s:
+        from plots import FIGURE_CACHE_DIR, analysis_figures, render_figures
+    print(f"Imported plotting libraries in {s.wall:.2f} s")
+
+    # figures are rendered in parallel on the Agg backend and reused from the
+    # figure cache when their inputs have not changed
+    corr = zip_level[CORR_COLUMNS].corr()
+    with step("plot") as s:
+        status = render_figures(
+            analysis_figures(zip_level, corr), results_dir, workers=workers, force=force,
+            cache_dir=cache_dir or FIGURE_CACHE_DIR,
+        )
+        s.rows = sum(state == "rendered" for state in status.values())
+    for name, state in status.items():
+        print(f"{name}: {state}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ZIP-level analysis and figures.")
+    parser.add_argument("command", nargs="?", choices=["stats", "plots", "all"], default="all",
+                        help="stats: summary tables only; plots: figures only; all (default): both")
+    parser.add_argument("--from-zip-summary", action="store_true",
+                        help="read the pre-aggregated data/processed/zip_risk_summary table written by "
+                             "04_data_integration.py --normalized instead of the integrated dataset")
+    parser.add_argument("--resamples", type=int, default=10_000,
+                        help="bootstrap and permutation resamples for the correlation significance table "
+                             "(0 skips it)")
+    parser.add_argument("--seed", type=int, default=477,
+                        help="random seed for the resampling")
+    parser.add_argument("--resample-workers", type=int, default=None,
+                        help="processes used for the resampling batches (default: in-process)")
+    parser.add_argument("--plot-workers", type=int, default=None,
+                        help="processes used to render figures (default: one per figure, up to the CPU count)")
+    parser.add_argument("--force-plots", action="store_true",
+                        help="re-render every figure even if a cached render matches its inputs")
+    args = parser.parse_args(argv)
+
+    PROCESSED_DIR = Path("data/processed")
+    RESULTS_DIR = Path("results")
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 
+    with step("load") as s:
+        zip_level = load_zip_level(PROCESSED_DIR, args.from_zip_summary)
+        s.rows = len(zip_level)
+
+    if args.command in ("stats", "all"):
+        with step("stats", rows=len(zip_level)):
+            write_stats(zip_level, RESULTS_DIR, n_resamples=args.resamples, seed=args.seed,
+                        workers=args.resample_workers)
+        # written by 04_data_integration.py from the violations text
+        if (PROCESSED_DIR / matrix_name(violation_table(args.from_zip_summary))).exists():
+            with step("violation_rates") as s:
+                rates = violation_rates(PROCESSED_DIR, args.from_zip_summary)
+                s.rows = len(rates)
+            write_violation_rates(rates, RESULTS_DIR)
+    if args.command in ("plots", "all"):
+        write_figures(zip_level, RESULTS_DIR, workers=args.plot_workers, force=args.force_plots,
+                      cache_dir=PROCESSED_DIR / "cache" / "figures")
 
 
 if __name__ == "__main__":
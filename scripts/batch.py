@@ -0,0 +1,238 @@
+# scripts/batch.py
+#
+# Multi-region batch mode: runs cleaning, integration and analysis for several
+# cities' inspection datasets against one shared ZHVI snapshot, one region per
+# worker process.
+#
+# Regions are described in a JSON config (see regions.json):
+#   {
+#     "zhvi": "data/raw/zhvi.csv",
+#     "output_root": "regions",
+#     "regions": {
+#       "chicago": {
+#         "raw_dir": "data/raw",    # default <output_root>/<region>/data/raw
+#         "endpoint": "https://data.cityofchicago.org/resource/4ijn-s7e5.json",
+#         "columns": null,          # {pipeline column: dataset column}
+#         "risk_values": null,      # {dataset risk label: "Risk 1 (High)", ...}
+#         "zhvi_geography": null    # e.g. {"City": ["Chicago"], "State": ["IL"]}
+#       }
+#     }
+#   }
+# A column mapping has to cover schema.REQUIRED_FOOD_COLUMNS, plus inspection_id
+# when it maps violations. Each region reads food_inspections.csv from its raw
+# directory and writes <output_root>/<region>/data/processed/ (including its own
+# figure cache) and <output_root>/<region>/results/.
+#
+# The ZHVI file is cleaned once and its per-ZIP aggregates are saved as .npy
+# files (zhvi.save_snapshot) under data/processed/cache/, keyed by the file's
+# SHA-256. Workers open them with mmap_mode="r", so every process shares the
+# same read-only pages instead of parsing the national file again.
+#
+# Usage:
+#   python scripts/batch.py                                  # every region in regions.json
+#   python scripts/batch.py --regions chicago --workers 2
+#   python scripts/batch.py --acquire                        # download the raw files first
+
+import argparse
+import contextlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import instrument
+from checksums import cached_sha256
+from instrument import step
+from pipeline import run, stage
+from schema import REQUIRED_FOOD_COLUMNS
+from zhvi import build_aggregates, load_snapshot, save_snapshot, subset_aggregates
+
+DESCRIPTION = "Run the pipeline for several regions against one shared ZHVI snapshot."
+
+CACHE_DIR = Path("data/processed/cache")
+
+# snapshot opened by each worker process (see open_snapshot)
+_snapshot = None
+
+
+def load_config(path):
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    config.setdefault("zhvi", "data/raw/zhvi.csv")
+    config.setdefault("output_root", "regions")
+    if not config.get("regions"):
+        raise ValueError(f"{path}: no regions configured")
+    for name, region in config["regions"].items():
+        columns = region.get("columns")
+        if not columns:
+            continue
+        missing = [col for col in REQUIRED_FOOD_COLUMNS if col not in columns]
+        # the violation matrix is keyed by inspection_id
+        if "violations" in columns and "inspection_id" not in columns:
+            missing.append("inspection_id")
+        if missing:
+            raise ValueError(f"{path}: region {name!r} has no column mapping for {missing}")
+    return config
+
+
+def region_dirs(config, name):
+    # -> (raw, processed, results) directories of one region
+    root = Path(config["output_root"]) / name
+    raw_dir = config["regions"][name].get("raw_dir") or root / "data" / "raw"
+    return Path(raw_dir), root / "data" / "processed", root / "results"
+
+
+def food_path(config, name):
+    return region_dirs(config, name)[0] / "food_inspections.csv"
+
+
+def acquire(config, names):
+    # food inspections per region (Socrata), the ZHVI file once
+    acquisition = stage("01_data_acquisition")
+    for name in names:
+        region = config["regions"][name]
+        if not region.get("endpoint"):
+            print(f"{name}: no endpoint configured; using {food_path(config, name)}")
+            continue
+        argv = ["--output-dir", str(food_path(config, name).parent), "--endpoint", region["endpoint"],
+                "--no-zhvi"]
+        for field in ("date_field", "id_field"):
+            if region.get(field):
+                argv += [f"--{field.replace('_', '-')}", region[field]]
+        with step(f"acquire_{name}"):
+            acquisition.main(argv)
+    zhvi_path = Path(config["zhvi"])
+    zhvi_path.parent.mkdir(parents=True, exist_ok=True)
+    with step("download_zhvi"):
+        downloaded = acquisition.download_zhvi(zhvi_path.parent)
+    if downloaded != zhvi_path:
+        raise ValueError(f"ZHVI was downloaded to {downloaded}; set \"zhvi\" to that path")
+
+
+def prepare_snapshot(zhvi_path, cache_dir=CACHE_DIR):
+    # clean the national ZHVI file once per snapshot; the missing-data filters
+    # are per ZIP, so selecting a region afterwards gives the same rows as
+    # cleaning with that region's geography filter
+    directory = Path(cache_dir) / f"zhvi_snapshot_{cached_sha256(zhvi_path)[:16]}"
+    if directory.exists():
+        # mark as used for stage_cache.py prune
+        os.utime(directory)
+        print(f"Using ZHVI snapshot {directory}")
+        return directory
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        meta, values, months = stage("03_data_cleaning_zhvi").clean_zhvi(zhvi_path)
+    save_snapshot(meta, build_aggregates(meta, values, months), directory)
+    print(f"ZHVI snapshot ({len(meta):,} ZIPs x {len(months)} months) written to {directory}")
+    return directory
+
+
+def open_snapshot(directory):
+    # process-pool initializer: memory-map the snapshot once per worker
+    global _snapshot
+    _snapshot = load_snapshot(directory, mmap=True)
+
+
+def region_zhvi(geography=None):
+    # (metadata, aggregates) for one region; without a geography filter the
+    # aggregates stay views into the shared memory maps
+    meta, aggregates = _snapshot
+    geography = {col: values for col, values in (geography or {}).items() if values}
+    if not geography:
+        return meta, aggregates
+    mask = np.ones(len(meta), dtype=bool)
+    for col, values in geography.items():
+        mask &= meta[col].isin(values).to_numpy()
+    rows = np.flatnonzero(mask)
+    return meta.iloc[rows].reset_index(drop=True), subset_aggregates(aggregates, rows)
+
+
+def run_region(config, name, options):
+    # one region end to end; its console output goes to results/batch_log.txt
+    region = config["regions"][name]
+    raw_dir, processed_dir, results_dir = region_dirs(config, name)
+    results_dir.mkdir(parents=True, exist_ok=True)
+    instrument.RUN_ID = f"{options['run_id']}-{name}"
+
+    with open(results_dir / "batch_log.txt", "w", encoding="utf-8") as log, \
+            contextlib.redirect_stdout(log):
+        timings = run(
+            raw_dir=raw_dir,
+            processed_dir=processed_dir,
+            results_dir=results_dir,
+            write_checkpoints=options["checkpoint"],
+            normalized=options["normalized"],
+            plots=options["plots"],
+            n_resamples=options["resamples"],
+            seed=options["seed"],
+            # each region already has its own process
+            plot_workers=1,
+            food_columns=region.get("columns"),
+            risk_values=region.get("risk_values"),
+            zhvi=region_zhvi(region.get("zhvi_geography")),
+        )
+    return name, timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--config", default="regions.json")
+    parser.add_argument("--regions", nargs="+", default=None,
+                        help="only run these regions (default: all in the config)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: one per region, up to the CPU count)")
+    parser.add_argument("--acquire", action="store_true",
+                        help="download each region's inspections and the ZHVI file first")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="also write each region's cleaned and integrated tables")
+    parser.add_argument("--normalized", action="store_true")
+    parser.add_argument("--no-plots", action="store_true")
+    parser.add_argument("--resamples", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=477)
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    names = args.regions or list(config["regions"])
+    unknown = [name for name in names if name not in config["regions"]]
+    if unknown:
+        raise ValueError(f"Regions not in {args.config}: {unknown}")
+
+    if args.acquire:
+        acquire(config, names)
+    missing = [str(food_path(config, name)) for name in names if not food_path(config, name).exists()]
+    if missing:
+        raise FileNotFoundError(f"Missing inspection files (run with --acquire?): {missing}")
+
+    with step("zhvi_snapshot"):
+        snapshot_dir = prepare_snapshot(config["zhvi"])
+
+    options = {
+        "checkpoint": args.checkpoint,
+        "normalized": args.normalized,
+        "plots": not args.no_plots,
+        "resamples": args.resamples,
+        "seed": args.seed,
+        "run_id": instrument.RUN_ID,
+    }
+    workers = args.workers or min(len(names), os.cpu_count() or 1)
+    print(f"Running {len(names)} regions with {workers} worker(s)")
+    with step("regions", rows=len(names)):
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=open_snapshot,
+                                     initargs=(snapshot_dir,)) as pool:
+                futures = [pool.submit(run_region, config, name, options) for name in names]
+                results = [future.result() for future in futures]
+        else:
+            open_snapshot(snapshot_dir)
+            results = [run_region(config, name, options) for name in names]
+
+    print("\n===== REGION TIMINGS (s) =====")
+    for name, timings in results:
+        stages = "  ".join(f"{stage_name} {seconds:.2f}" for stage_name, seconds in timings.items())
+        print(f"  {name:<16} total {sum(timings.values()):7.2f}   {stages}")
+        print(f"  {'':<16} outputs in {region_dirs(config, name)[2]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# scripts/checksums.py
+#
+# Shared SHA-256 helpers for every pipeline stage.
+#
+# Files are hashed in fixed-size chunks so memory use does not depend on file
+# size. Each hash is recorded with the file's size and mtime in one manifest
+# (data/checksums.json); if a file's size and mtime have not changed since it
+# was last hashed, the recorded hash is reused instead of reading the file again.
+#
+# Usage:
+#   python scripts/checksums.py verify            # check data/raw and data/processed
+#   python scripts/checksums.py verify --workers 8
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+CHUNK_SIZE = 1024 * 1024
+MANIFEST_PATH = Path("data/checksums.json")
+DATA_DIRS = [Path("data/raw"), Path("data/processed")]
+
+
+def sha256_file(path, chunk_size=CHUNK_SIZE):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def sidecar_path(path):
+    # data/raw/zhvi.csv -> data/raw/zhvi.sha256
+    return Path(path).with_suffix(".sha256")
+
+
+def is_csv_copy(path):
+    # storage.write_table(csv_copy=True) writes <name>.csv next to
+    # <name>.parquet; their shared <name>.sha256 sidecar belongs to the Parquet file
+    path = Path(path)
+    return path.suffix == ".csv" and path.with_suffix(".parquet").exists()
+
+
+def load_manifest(manifest_path=MANIFEST_PATH):
+    if Path(manifest_path).exists():
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(manifest, manifest_path=MANIFEST_PATH):
+    # stages can run in parallel under Snakemake; re-read and merge right before
+    # writing so one stage does not drop another's entries, then swap atomically
+    manifest_path = Path(manifest_path)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    merged = load_manifest(manifest_path)
+    merged.update(manifest)
+    tmp_path = manifest_path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(merged, f, indent=2, sort_keys=True)
+    tmp_path.replace(manifest_path)
+
+
+def file_stat(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def record(path, sha, manifest_path=MANIFEST_PATH):
+    # store a hash computed elsewhere (e.g. while streaming a download)
+    entry = {**file_stat(path), "sha256": sha}
+    save_manifest({Path(path).as_posix(): entry}, manifest_path)
+    return sha
+
+
+def cached_sha256(path, manifest_path=MANIFEST_PATH):
+    key = Path(path).as_posix()
+    entry = load_manifest(manifest_path).get(key)
+    stat = file_stat(path)
+    if entry and entry["size"] == stat["size"] and entry["mtime_ns"] == stat["mtime_ns"]:
+        return entry["sha256"]
+    sha = sha256_file(path)
+    save_manifest({key: {**stat, "sha256": sha}}, manifest_path)
+    return sha
+
+
+def write_checksum(path, sha=None, manifest_path=MANIFEST_PATH):
+    # hash (or reuse the cached hash of) a data file and write its .sha256 sidecar
+    if sha is None:
+        sha = cached_sha256(path, manifest_path)
+    else:
+        record(path, sha, manifest_path)
+    with open(sidecar_path(path), "w", encoding="utf-8") as f:
+        f.write(sha)
+    return sha
+
+
+def _verify_one(path):
+    expected = sidecar_path(path).read_text(encoding="utf-8").strip()
+    actual = sha256_file(path)
+    return path, "ok" if actual == expected else "mismatch", actual
+
+
+def verify(data_dirs=DATA_DIRS, workers=None, manifest_path=MANIFEST_PATH):
+    # always rehash from disk here: the point of verify is to catch content that
+    # changed without the manifest noticing
+    files = sorted(
+        path
+        for data_dir in data_dirs
+        if Path(data_dir).exists()
+        for path in Path(data_dir).iterdir()
+        if path.is_file() and sidecar_path(path) != path and sidecar_path(path).exists()
+        and not is_csv_copy(path)
+    )
+    results = []
+    verified = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path, status, actual in pool.map(_verify_one, files):
+            results.append((str(path), status))
+            if status == "ok":
+                verified[path.as_posix()] = {**file_stat(path), "sha256": actual}
+    if verified:
+        save_manifest(verified, manifest_path)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chunked SHA-256 checksums for pipeline artifacts.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    verify_parser = sub.add_parser("verify", help="check every data file against its .sha256 sidecar")
+    verify_parser.add_argument("--workers", type=int, default=None,
+                               help="number of processes (default: one per core)")
+    verify_parser.add_argument("dirs", nargs="*", default=[str(d) for d in DATA_DIRS])
+    args = parser.parse_args(argv)
+
+    if args.command == "verify":
+        results = verify([Path(d) for d in args.dirs], workers=args.workers)
+        failed = 0
+        for path, status in results:
+            print(f"{status.upper():>8}  {path}")
+            failed += status != "ok"
+        print(f"\n{len(results) - failed}/{len(results)} files verified")
+        return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,47 @@
+# scripts/establishments.py
+#
+# Establishment keys and "latest inspection per establishment" de-duplication.
+#
+# An establishment is identified by license number + address. Instead of
+# concatenating the two as Python strings, each column is factorized to integer
+# codes and the pair is combined into one int64 key. The latest inspection per
+# key is found with a hash groupby idxmax on the inspection date, so only row
+# positions are carried around until the final take.
+#
+# The factorized codes only mean something within one frame. Indexes that are
+# written to disk (see history_index.py) use stable_establishment_key instead,
+# a uint64 hash of the same two columns that is identical in every run.
+
+import numpy as np
+import pandas as pd
+
+
+def establishment_key(df, license_col="license_", address_col="address"):
+    # missing values get their own code, like the old fillna("UNKNOWN")
+    license_codes, _ = pd.factorize(df[license_col], use_na_sentinel=False)
+    address_codes, address_uniques = pd.factorize(df[address_col], use_na_sentinel=False)
+    return license_codes.astype(np.int64) * len(address_uniques) + address_codes
+
+
+def stable_establishment_key(df, license_col="license_", address_col="address"):
+    # license numbers are read as floats when the column has gaps; hash them as
+    # integers so 12345.0 and 12345 give the same key
+    license_numbers = pd.to_numeric(df[license_col], errors="coerce").astype("Int64").astype(str)
+    parts = pd.DataFrame({
+        "license": license_numbers.to_numpy(),
+        "address": df[address_col].astype(str).str.strip().to_numpy(),
+    })
+    return pd.util.hash_pandas_object(parts, index=False).to_numpy()
+
+
+def latest_positions(key, dates):
+    # positions of the most recent row per key; ties keep the earliest row
+    dates = pd.Series(np.asarray(dates))
+    return dates.groupby(np.asarray(key), sort=False).idxmax().to_numpy()
+
+
+def latest_per_establishment(df, date_col="inspection_date", key=None):
+    if key is None:
+        key = establishment_key(df)
+    positions = np.sort(latest_positions(key, df[date_col]))
+    return df.iloc[positions].reset_index(drop=True)
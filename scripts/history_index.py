@@ -0,0 +1,154 @@
+# scripts/history_index.py
+#
+# Persistent index of every establishment's full inspection history.
+#
+# Stage 03 keeps only the latest inspection per establishment. This script keeps
+# all of them, sorted by a stable establishment hash (license + address, see
+# establishments.stable_establishment_key) and then by date, and writes
+#   data/processed/inspection_history.parquet      the sorted inspections
+#   data/processed/inspection_history_index.npz    unique hashes + row offsets
+# A lookup binary-searches the hash in the index and reads only the Parquet row
+# groups that hold that establishment's rows, so it costs O(log n) plus one or
+# two row groups of I/O instead of a scan of the whole history.
+#
+# Usage (after stage 01):
+#   python scripts/history_index.py build
+#   python scripts/history_index.py lookup --license 2589467 --address "1400 W MADISON ST"
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from checksums import write_checksum
+from establishments import stable_establishment_key
+from instrument import step
+from schema import clean_zip_strings
+from storage import table_path, write_table
+
+DESCRIPTION = "Build or query the per-establishment inspection history index."
+
+HISTORY_NAME = "inspection_history"
+INDEX_NAME = "inspection_history_index.npz"
+ROW_GROUP_SIZE = 16_384
+
+HISTORY_COLUMNS = [
+    "inspection_id",
+    "dba_name",
+    "license_",
+    "facility_type",
+    "risk",
+    "address",
+    "zip",
+    "inspection_date",
+    "inspection_type",
+    "results",
+    "violations",
+    "latitude",
+    "longitude",
+]
+
+
+def build_history(raw_path):
+    # every inspection with a license, address and valid date, sorted by
+    # establishment hash and then date -> (history, unique hashes, row offsets)
+    food = pd.read_csv(raw_path, usecols=lambda col: col in HISTORY_COLUMNS)
+    food["inspection_date"] = pd.to_datetime(food["inspection_date"], errors="coerce")
+    food = food.dropna(subset=["license_", "address", "inspection_date"])
+    food["zip"], _ = clean_zip_strings(food["zip"])
+
+    keys = stable_establishment_key(food)
+    order = np.lexsort((food["inspection_date"].to_numpy(), keys))
+    history = food.iloc[order].reset_index(drop=True)
+    history.insert(0, "establishment_hash", keys[order])
+
+    unique_keys, starts = np.unique(history["establishment_hash"].to_numpy(), return_index=True)
+    offsets = np.append(starts, len(history)).astype(np.int64)
+    return history, unique_keys, offsets
+
+
+def write_history(history, unique_keys, offsets, processed_dir):
+    output_file = write_table(history, processed_dir / HISTORY_NAME, row_group_size=ROW_GROUP_SIZE)
+    write_checksum(output_file)
+    index_file = processed_dir / INDEX_NAME
+    np.savez(index_file, keys=unique_keys, offsets=offsets)
+    write_checksum(index_file)
+    return output_file, index_file
+
+
+class HistoryIndex:
+    # lookups against the files written by write_history
+
+    def __init__(self, processed_dir=Path("data/processed")):
+        processed_dir = Path(processed_dir)
+        with np.load(processed_dir / INDEX_NAME) as index:
+            self.keys = index["keys"]
+            self.offsets = index["offsets"]
+        self.parquet = pq.ParquetFile(table_path(processed_dir / HISTORY_NAME))
+        group_rows = [self.parquet.metadata.row_group(i).num_rows
+                      for i in range(self.parquet.num_row_groups)]
+        self.group_starts = np.concatenate([[0], np.cumsum(group_rows)]).astype(np.int64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def row_range(self, key):
+        # -> (start, stop) rows of one establishment hash; (0, 0) when unknown
+        position = np.searchsorted(self.keys, key)
+        if position == len(self.keys) or self.keys[position] != key:
+            return 0, 0
+        return int(self.offsets[position]), int(self.offsets[position + 1])
+
+    def rows(self, start, stop):
+        # read only the row groups that overlap [start, stop)
+        if stop <= start:
+            return self.parquet.schema_arrow.empty_table().to_pandas()
+        first = int(np.searchsorted(self.group_starts, start, side="right")) - 1
+        last = int(np.searchsorted(self.group_starts, stop, side="left"))
+        table = self.parquet.read_row_groups(list(range(first, last)))
+        offset = self.group_starts[first]
+        return table.slice(start - offset, stop - start).to_pandas()
+
+    def lookup(self, license_number, address):
+        # full inspection history of one establishment, oldest first
+        key = stable_establishment_key(pd.DataFrame({"license_": [license_number], "address": [address]}))[0]
+        return self.rows(*self.row_range(key))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="sort the raw inspections and write the history and its index")
+    lookup_parser = sub.add_parser("lookup", help="print one establishment's inspection history")
+    lookup_parser.add_argument("--license", required=True)
+    lookup_parser.add_argument("--address", required=True)
+    args = parser.parse_args(argv)
+
+    RAW_DIR = Path("data/raw")
+    PROCESSED_DIR = Path("data/processed")
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+
+    if args.command == "build":
+        with step("build_history") as s:
+            history, unique_keys, offsets = build_history(RAW_DIR / "food_inspections.csv")
+            s.rows = len(history)
+        with step("write", rows=len(history)):
+            output_file, index_file = write_history(history, unique_keys, offsets, PROCESSED_DIR)
+        print(f"Inspection history: {len(history):,} inspections of {len(unique_keys):,} establishments")
+        print(f"Written to {output_file} and {index_file}")
+        return
+
+    with step("lookup") as s:
+        history = HistoryIndex(PROCESSED_DIR).lookup(args.license, args.address)
+        s.rows = len(history)
+    if history.empty:
+        print(f"No inspections for license {args.license} at {args.address}")
+        return
+    print(f"{len(history)} inspections for license {args.license} at {args.address}:")
+    print(history.drop(columns=["establishment_hash"]).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# scripts/instrument.py
+#
+# Per-step timing and memory records for the pipeline scripts.
+#
+#   from instrument import step
+#
+#   with step("dedup") as s:
+#       latest = latest_per_establishment(df)
+#       s.rows = len(latest)
+#
+# Each step appends one JSON line to results/instrumentation.jsonl with the
+# script, step name, wall and CPU seconds, row count and the process's peak RSS
+# so far. Environment switches (so Snakemake rules and the CLIs stay as they are):
+#   PIPELINE_TRACEMALLOC=1   also record the tracemalloc peak of each step
+#                            (a nested step resets its parent's peak)
+#   PIPELINE_PROFILE=1       cProfile every outermost step and dump the slowest
+#                            one to results/profile_<script>_<step>.prof
+#   PIPELINE_RUN_ID=<id>     tag the records (defaults to time + pid)
+#
+# Usage:
+#   python scripts/instrument.py summary            # wall time per step, last 5 runs
+#   python scripts/instrument.py summary --runs 10
+
+import argparse
+import atexit
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+LOG_PATH = Path("results/instrumentation.jsonl")
+
+RUN_ID = os.environ.get("PIPELINE_RUN_ID") or f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+TRACE_MEMORY = os.environ.get("PIPELINE_TRACEMALLOC") == "1"
+PROFILE = os.environ.get("PIPELINE_PROFILE") == "1"
+
+# slowest profiled step so far: (wall seconds, step name, profiler)
+_slowest = None
+# only one cProfile profiler can be active, so nested steps are covered by the
+# outermost one
+_profiling = False
+
+
+def script_name():
+    return Path(sys.argv[0]).stem or "interactive"
+
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def write_record(record, log_path=LOG_PATH):
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def _dump_slowest_profile():
+    if _slowest is not None:
+        _, name, profiler = _slowest
+        path = LOG_PATH.parent / f"profile_{script_name()}_{name}.prof"
+        profiler.dump_stats(path)
+        print(f"[instrument] cProfile of slowest step '{name}' written to {path}")
+
+
+class step(contextlib.ContextDecorator):
+    # context manager / decorator; set .rows inside the block to record a row count
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self.wall = None
+
+    def __enter__(self):
+        global _profiling
+        if TRACE_MEMORY:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        self._profiler = cProfile.Profile() if PROFILE and not _profiling else None
+        self._started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+        if self._profiler is not None:
+            _profiling = True
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _slowest, _profiling
+        if self._profiler is not None:
+            self._profiler.disable()
+            _profiling = False
+        self.wall = time.perf_counter() - self._wall
+        record = {
+            "run": RUN_ID,
+            "script": script_name(),
+            "step": self.name,
+            "started": self._started_at,
+            "wall_s": round(self.wall, 4),
+            "cpu_s": round(time.process_time() - self._cpu, 4),
+            "rows": None if self.rows is None else int(self.rows),
+            "max_rss_mb": max_rss_mb(),
+        }
+        if TRACE_MEMORY:
+            record["tracemalloc_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        write_record(record)
+
+        if self._profiler is not None and (_slowest is None or self.wall > _slowest[0]):
+            if _slowest is None:
+                atexit.register(_dump_slowest_profile)
+            _slowest = (self.wall, self.name, self._profiler)
+        return False
+
+
+def load_records(log_path=LOG_PATH):
+    if not Path(log_path).exists():
+        return []
+    with open(log_path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-step pipeline instrumentation.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary_parser = sub.add_parser("summary", help="wall time per step for the most recent runs")
+    summary_parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "summary":
+        import pandas as pd
+
+        records = pd.DataFrame(load_records())
+        if records.empty:
+            print(f"No records in {LOG_PATH}")
+            return 0
+        # one wall time per (run, script, step), in the order the runs happened
+        per_run = records.groupby(["script", "step", "run"], sort=False)["wall_s"].sum().reset_index()
+        recent = per_run.groupby(["script", "step"], sort=False).tail(args.runs)
+        by_step = recent.groupby(["script", "step"], sort=False)["wall_s"]
+        table = pd.DataFrame({
+            "runs": by_step.size(),
+            "latest_s": by_step.last(),
+            "previous_s": by_step.apply(lambda s: s.iloc[-2] if len(s) > 1 else float("nan")),
+            "median_s": by_step.median(),
+        })
+        table["change"] = table["latest_s"] / table["previous_s"] - 1
+        print(f"Wall time per step over the last {args.runs} runs of each script ({LOG_PATH}):")
+        print(table.round(3).to_string())
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+# scripts/panel.py
+#
+# Time-resolved view of the data: a (zip, month) panel of inspection risk counts
+# from the full inspection history, joined with the ZHVI value for that ZIP and
+# month, plus lagged correlations between risk shares and housing values.
+#
+# Inspection dates are bucketed to months with one datetime64[M] cast, and
+# (zip, month, risk) counts come from one bincount over combined integer keys
+# (see zip_summary.risk_count_matrix). Monthly ZHVI values are attached with a
+# sorted merge_asof by ZIP with a zero tolerance, so a panel month only gets
+# the ZHVI of that same month (months without a value stay NaN instead of
+# carrying an older value forward); each lag is one more merge_asof against the
+# ZHVI table shifted by that many months.
+#
+# Usage (after stages 01-03):
+#   python scripts/panel.py
+#   python scripts/panel.py --lags -12 -6 0 6 12 --min-inspections 5
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from checksums import write_checksum
+from instrument import step
+from schema import clean_zip_strings, zip_codes
+from storage import read_table, write_table
+from zhvi import split_zhvi, to_long
+from zip_summary import RISK_LEVELS, risk_count_matrix
+
+DESCRIPTION = "Build the (zip, month) inspection/ZHVI panel and its lagged correlations."
+
+DEFAULT_LAGS = [-12, -6, -3, 0, 3, 6, 12]
+
+# combined (zip, month) key: zip * MONTH_RADIX + months since 1970-01
+MONTH_RADIX = 10_000
+
+
+def to_month(dates):
+    # datetimes -> first day of their month, as datetime64[ns]
+    return pd.to_datetime(dates).to_numpy().astype("datetime64[M]").astype("datetime64[ns]")
+
+
+def inspection_history(raw_path):
+    # every inspection with a valid date, ZIP and risk; unlike stage 03 this
+    # keeps the full history, not only the latest inspection per establishment
+    food = pd.read_csv(raw_path, usecols=["inspection_date", "zip", "risk"], dtype={"zip": str})
+    food["inspection_date"] = pd.to_datetime(food["inspection_date"], errors="coerce")
+    food = food.dropna()
+    food["zip"], valid_zip = clean_zip_strings(food["zip"])
+    food = food[valid_zip]
+    return pd.DataFrame({
+        "zip": zip_codes(food["zip"]),
+        "month": to_month(food["inspection_date"]),
+        "risk": food["risk"].to_numpy(),
+    })
+
+
+def monthly_risk_counts(history, risk_levels=None):
+    # -> one row per (zip, month) with counts and shares per risk level
+    risk_levels = RISK_LEVELS if risk_levels is None else risk_levels
+    month_index = history["month"].to_numpy().astype("datetime64[M]").astype(np.int64)
+    keys = history["zip"].to_numpy().astype(np.int64) * MONTH_RADIX + month_index
+    key_index, counts = risk_count_matrix(keys, history["risk"], risk_levels.keys())
+    key_index = np.asarray(key_index)
+
+    total = counts.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        proportions = counts / total[:, None]
+
+    columns = {
+        "zip": (key_index // MONTH_RADIX).astype(np.int32),
+        "month": (key_index % MONTH_RADIX).astype("datetime64[M]").astype("datetime64[ns]"),
+    }
+    for i, prefix in enumerate(risk_levels.values()):
+        columns[f"{prefix}_count"] = counts[:, i]
+    columns["total_inspections"] = total
+    for i, prefix in enumerate(risk_levels.values()):
+        columns[f"{prefix}_prop"] = proportions[:, i]
+    return pd.DataFrame(columns)
+
+
+def zhvi_monthly(zhvi_wide):
+    # wide cleaned ZHVI table -> (zip, month, zhvi) with months as first-of-month
+    long = to_long(*split_zhvi(zhvi_wide))
+    return pd.DataFrame({
+        "zip": zip_codes(long["zip"]),
+        "month": to_month(long["month"]),
+        "zhvi": long["zhvi"].to_numpy(dtype=np.float64),
+    })
+
+
+def attach_zhvi(panel, zhvi_long, lag=0, column="zhvi"):
+    # column = ZHVI of the same ZIP exactly `lag` months before the panel
+    # month, NaN when that month has no value; negative lags look ahead
+    shifted = zhvi_long.assign(
+        month=(zhvi_long["month"].to_numpy().astype("datetime64[M]") + lag).astype("datetime64[ns]")
+    ).rename(columns={"zhvi": column})
+    merged = pd.merge_asof(
+        panel.sort_values("month"),
+        shifted.sort_values("month"),
+        on="month",
+        by="zip",
+        direction="backward",
+        # both sides hold first-of-month dates, so only the same month matches;
+        # any positive tolerance would let a missing month take an earlier one
+        tolerance=pd.Timedelta(0),
+    )
+    return merged.sort_values(["zip", "month"], ignore_index=True)
+
+
+def pearson(x, y):
+    keep = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[keep] - x[keep].mean(), y[keep] - y[keep].mean()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (x * y).sum() / np.sqrt((x * x).sum() * (y * y).sum()), int(keep.sum())
+
+
+def within_zip(df, column):
+    # values minus their ZIP mean, so only changes over time within a ZIP remain
+    return (df[column] - df.groupby("zip")[column].transform("mean")).to_numpy(dtype=np.float64)
+
+
+def lagged_correlations(panel, zhvi_long, lags=DEFAULT_LAGS, risk_columns=None):
+    # pooled r over all (zip, month) rows, and within-ZIP r after removing each
+    # ZIP's mean from both sides
+    risk_columns = risk_columns or [f"{prefix}_prop" for prefix in RISK_LEVELS.values()]
+    rows = []
+    for lag in lags:
+        lagged = attach_zhvi(panel, zhvi_long, lag=lag, column="zhvi_lagged").dropna(subset=["zhvi_lagged"])
+        zhvi_within = within_zip(lagged, "zhvi_lagged")
+        for col in risk_columns:
+            r, n = pearson(lagged[col].to_numpy(dtype=np.float64), lagged["zhvi_lagged"].to_numpy())
+            r_within, _ = pearson(within_zip(lagged, col), zhvi_within)
+            rows.append({
+                "risk": col,
+                "lag_months": lag,
+                "n": n,
+                "n_zips": lagged["zip"].nunique(),
+                "r_pooled": r,
+                "r_within_zip": r_within,
+            })
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--lags", type=int, nargs="+", default=DEFAULT_LAGS,
+                        help="ZHVI lags in months; positive lags use earlier ZHVI months")
+    parser.add_argument("--min-inspections", type=int, default=1,
+                        help="drop (zip, month) cells with fewer inspections than this")
+    parser.add_argument("--csv", action="store_true",
+                        help="also write a CSV copy of the panel next to the Parquet file")
+    args = parser.parse_args(argv)
+
+    RAW_DIR = Path("data/raw")
+    PROCESSED_DIR = Path("data/processed")
+    RESULTS_DIR = Path("results")
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+
+    with step("history") as s:
+        history = inspection_history(RAW_DIR / "food_inspections.csv")
+        s.rows = len(history)
+    print(f"Inspection history: {len(history):,} inspections in {history['zip'].nunique()} ZIPs, "
+          f"{history['month'].min():%Y-%m} to {history['month'].max():%Y-%m}")
+
+    with step("panel") as s:
+        panel = monthly_risk_counts(history)
+        panel = panel[panel["total_inspections"] >= args.min_inspections]
+
+        zhvi_long = zhvi_monthly(read_table(PROCESSED_DIR / "zhvi_cleaned"))
+        panel = attach_zhvi(panel, zhvi_long)
+        panel = panel[panel["zip"].isin(zhvi_long["zip"].unique())].reset_index(drop=True)
+        s.rows = len(panel)
+    print(f"Panel: {len(panel):,} (zip, month) rows, {panel['zip'].nunique()} ZIPs, "
+          f"{panel['zhvi'].notna().sum():,} with a ZHVI value")
+
+    output_file = write_table(panel, PROCESSED_DIR / "zip_month_panel", csv_copy=args.csv)
+    write_checksum(output_file)
+
+    with step("lagged_correlations", rows=len(panel) * len(args.lags)):
+        correlations = lagged_correlations(panel, zhvi_long, lags=args.lags)
+    correlations.to_csv(RESULTS_DIR / "panel_lagged_correlations.csv", index=False)
+    print("\nLagged correlations (risk share vs ZHVI lag_months earlier):")
+    print(correlations.round(3).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
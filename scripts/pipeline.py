@@ -0,0 +1,171 @@
+# scripts/pipeline.py
+#
+# In-process pipeline runner: runs stages 02-05 (optionally 01) in one Python
+# process and hands the cleaned and integrated tables from stage to stage as
+# DataFrames, instead of writing each one to data/processed/ and parsing it
+# again in a fresh interpreter. Each stage script exposes its work as functions
+# (clean_food, clean_zhvi, integrate, ...) that this runner calls; the scripts'
+# own main() functions and the Snakefile are unchanged in behaviour.
+#
+# The final results/ files are always written. With --checkpoint the
+# intermediate tables are also written to data/processed/ (with checksums),
+# exactly as the stage scripts would, so later script or Snakemake runs can
+# pick up from them.
+#
+# Usage:
+#   python scripts/pipeline.py                  # raw files -> results/
+#   python scripts/pipeline.py --checkpoint     # ... and keep the processed tables
+#   python scripts/pipeline.py --acquire        # download the raw files first
+
+import argparse
+import importlib
+from pathlib import Path
+
+from checksums import write_checksum
+from instrument import step
+from storage import write_table
+from violations import matrix_name, save_violations, zip_violation_rates
+from zhvi import build_aggregates, to_wide
+
+DESCRIPTION = "Run the pipeline in one process, passing DataFrames between stages."
+
+
+def stage(name):
+    # the stage scripts start with a digit, so they cannot be imported with a
+    # plain import statement
+    return importlib.import_module(name)
+
+
+def checkpoint(table, path, csv_copy=False):
+    output_file = write_table(table, path, csv_copy=csv_copy)
+    write_checksum(output_file)
+    return output_file
+
+
+def run(raw_dir=Path("data/raw"), processed_dir=Path("data/processed"), results_dir=Path("results"),
+        acquire=False, write_checkpoints=False, geography=None, recent_start="2020-01-01",
+        recent_end=None, normalized=False, plots=True, n_resamples=10_000, seed=477,
+        plot_workers=None, food_columns=None, risk_values=None, zhvi=None):
+    # zhvi: optional (metadata table, aggregates) already prepared by the caller,
+    # e.g. one shared snapshot for several regions (see batch.py); the ZHVI
+    # storage report and cleaning are then skipped.
+    # food_columns / risk_values: mapping for non-Chicago inspection datasets
+    # (see 03_data_cleaning_food.map_columns)
+    # -> {stage: seconds}
+    raw_dir, processed_dir, results_dir = Path(raw_dir), Path(processed_dir), Path(results_dir)
+    processed_dir.mkdir(parents=True, exist_ok=True)
+    results_dir.mkdir(parents=True, exist_ok=True)
+    timings = {}
+
+    def timed(name, func, *args, **kwargs):
+        print(f"\n===== {name} =====")
+        with step(name) as s:
+            result = func(*args, **kwargs)
+            if hasattr(result, "__len__") and not isinstance(result, tuple):
+                s.rows = len(result)
+        timings[name] = s.wall
+        return result
+
+    if acquire:
+        timed("acquisition", stage("01_data_acquisition").main, ["--output-dir", str(raw_dir)])
+
+    if zhvi is None:
+        storage = stage("02_data_storage")
+        lines = timed("storage", storage.storage_report,
+                      raw_dir / "food_inspections.csv", raw_dir / "zhvi.csv")
+        storage.write_report(lines, results_dir)
+
+    food_cleaned = timed("clean_food", stage("03_data_cleaning_food").clean_food,
+                         raw_dir / "food_inspections.csv", columns=food_columns, risk_values=risk_values)
+    if write_checkpoints:
+        checkpoint(food_cleaned, processed_dir / "food_inspections_cleaned")
+
+    integration = stage("04_data_integration")
+    if zhvi is None:
+        meta, values, months = timed("clean_zhvi", stage("03_data_cleaning_zhvi").clean_zhvi,
+                                     raw_dir / "zhvi.csv", geography=geography)
+        if write_checkpoints:
+            checkpoint(to_wide(meta, values, months), processed_dir / "zhvi_cleaned")
+        zhvi = (meta, build_aggregates(meta, values, months))
+    zhvi_meta, aggregates = zhvi
+    zhvi_meta = zhvi_meta.reset_index(drop=True)
+    zhvi_meta = zhvi_meta[[col for col in integration.ZHVI_METADATA_COLUMNS if col in zhvi_meta.columns]]
+    tables, lines = timed("integrate", integration.integrate,
+                          food_cleaned, zhvi_meta, aggregates,
+                          recent_start=recent_start, recent_end=recent_end, normalized=normalized)
+    integration.write_summary(lines, results_dir)
+    tables, violations, inspection_ids = timed("violations", integration.split_violations, tables)
+    # the establishment table the violation matrix rows follow
+    violation_table = "integrated_establishments" if normalized else "integrated_food_housing"
+    if write_checkpoints:
+        for name, table in tables.items():
+            checkpoint(table, processed_dir / name)
+        if violations is not None:
+            save_violations(violations, inspection_ids, processed_dir / matrix_name(violation_table))
+            write_checksum(processed_dir / matrix_name(violation_table))
+
+    analysis = stage("05_data_analysis_visualization")
+    if normalized:
+        zip_level = tables["zip_risk_summary"]
+    else:
+        zip_level = analysis.zip_level_from_integrated(
+            tables["integrated_food_housing"][analysis.ANALYSIS_COLUMNS]
+        )
+    timed("stats", analysis.write_stats, zip_level, results_dir, n_resamples=n_resamples, seed=seed)
+    if violations is not None:
+        establishments = tables[violation_table]
+        rates = timed("violation_rates", zip_violation_rates, violations, establishments["zip"].to_numpy())
+        analysis.write_violation_rates(rates, results_dir)
+    if plots:
+        # figure cache next to this run's processed data, so batch regions do
+        # not evict (or delete in-flight renders of) each other's figures
+        timed("plots", analysis.write_figures, zip_level, results_dir, workers=plot_workers,
+              cache_dir=processed_dir / "cache" / "figures")
+
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--acquire", action="store_true",
+                        help="run 01_data_acquisition.py first instead of using the existing raw files")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="also write the cleaned and integrated tables to data/processed/")
+    parser.add_argument("--city", action="append", default=[],
+                        help="only keep ZHVI rows for this City (repeatable)")
+    parser.add_argument("--state", action="append", default=[],
+                        help="only keep ZHVI rows for this State (repeatable)")
+    parser.add_argument("--metro", action="append", default=[],
+                        help="only keep ZHVI rows for this Metro (repeatable)")
+    parser.add_argument("--recent-start", default="2020-01-01")
+    parser.add_argument("--recent-end", default=None)
+    parser.add_argument("--normalized", action="store_true",
+                        help="integrate into the normalized tables instead of the joined table")
+    parser.add_argument("--no-plots", action="store_true",
+                        help="skip the figures (and the matplotlib/seaborn import)")
+    parser.add_argument("--resamples", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=477)
+    parser.add_argument("--plot-workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    timings = run(
+        acquire=args.acquire,
+        write_checkpoints=args.checkpoint,
+        geography={"City": args.city, "State": args.state, "Metro": args.metro},
+        recent_start=args.recent_start,
+        recent_end=args.recent_end,
+        normalized=args.normalized,
+        plots=not args.no_plots,
+        n_resamples=args.resamples,
+        seed=args.seed,
+        plot_workers=args.plot_workers,
+    )
+
+    print("\n===== STAGE TIMINGS =====")
+    for name, seconds in timings.items():
+        print(f"  {name:<16} {seconds:8.2f} s")
+    print(f"  {'total':<16} {sum(timings.values()):8.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# scripts/plots.py
+#
+# Figure rendering for the analysis stage.
+#
+# Every figure is a (render function, input data, parameters) triple. Figures
+# are rendered headless on the Agg backend, in a process pool so the five
+# 300-dpi PNGs are drawn side by side instead of one after another.
+#
+# Each figure's key is a SHA-256 over its input data, its parameters, the
+# source of its render function and the matplotlib/seaborn versions. Rendered
+# PNGs are kept under that key in data/processed/cache/figures; when the key has
+# not changed since the last run, the cached PNG is copied into results/
+# instead of being drawn again. (Copying rather than skipping also works under
+# Snakemake, which deletes a rule's outputs before running it.)
+
+import hashlib
+import inspect
+import json
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt  # noqa: E402
+import pandas as pd  # noqa: E402
+import seaborn as sns  # noqa: E402
+
+FIGURE_DPI = 300
+FIGURE_CACHE_DIR = Path("data/processed/cache/figures")
+
+HIGH_RISK_TERTILES = ["Low high-risk", "Medium high-risk", "High high-risk"]
+LOW_RISK_TERTILES = ["Low low-risk", "Medium low-risk", "High low-risk"]
+
+
+# --- render functions: (data, path, dpi, **params) ---
+
+def correlation_heatmap(corr, path, dpi):
+    # Round to 2 decimals for annotation
+    annot_matrix = corr.round(2)
+
+    plt.figure(figsize=(8, 6))
+    ax = sns.heatmap(
+        corr,
+        cmap="coolwarm",
+        vmin=-1,
+        vmax=1,
+        annot=annot_matrix,
+        fmt="",
+        annot_kws={"size": 8, "color": "black"}
+    )
+    ax.set_title("Correlation: risk proportions and housing values (ZIP level)")
+    ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha="right")
+    ax.set_yticklabels(ax.get_yticklabels(), rotation=0)
+
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi)
+    plt.close()
+
+
+def risk_scatter(zip_level, path, dpi, x, color, xlabel, title):
+    plt.figure()
+    sns.regplot(
+        data=zip_level,
+        x=x,
+        y="avg_zhvi_recent",
+        scatter_kws={"alpha": 0.7},
+        line_kws={"color": color}
+    )
+    plt.xlabel(xlabel)
+    plt.ylabel("Average ZHVI (recent years, USD)")
+    plt.title(title)
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi)
+    plt.close()
+
+
+def tertile_boxplot(zip_level, path, dpi, column, labels, xlabel, title):
+    # low / medium / high tertiles of a risk proportion
+    zip_level = zip_level.assign(tertile=pd.qcut(zip_level[column], q=3, labels=labels))
+
+    plt.figure(figsize=(7, 5))
+    sns.boxplot(
+        data=zip_level,
+        x="tertile",
+        y="avg_zhvi_recent",
+        order=labels
+    )
+    sns.stripplot(
+        data=zip_level,
+        x="tertile",
+        y="avg_zhvi_recent",
+        order=labels,
+        color="black",
+        size=3,
+        alpha=0.5
+    )
+    plt.xlabel(xlabel)
+    plt.ylabel("Average ZHVI (recent years, USD)")
+    plt.title(title)
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi)
+    plt.close()
+
+
+def analysis_figures(zip_level, corr):
+    # -> list of (file name, render function, input data, params); each figure
+    # gets only the columns it draws, so unrelated changes do not invalidate it
+    return [
+        ("correlation_heatmap.png", correlation_heatmap, corr, {}),
+        ("high_risk_vs_zhvi_scatter.png", risk_scatter,
+         zip_level[["high_risk_prop", "avg_zhvi_recent"]],
+         {"x": "high_risk_prop", "color": "red",
+          "xlabel": "Proportion of high-risk inspections (per ZIP)",
+          "title": "High-risk share vs housing values"}),
+        ("low_risk_vs_zhvi_scatter.png", risk_scatter,
+         zip_level[["low_risk_prop", "avg_zhvi_recent"]],
+         {"x": "low_risk_prop", "color": "green",
+          "xlabel": "Proportion of low-risk inspections (per ZIP)",
+          "title": "Low-risk share vs housing values"}),
+        ("housing_by_high_risk_tertiles.png", tertile_boxplot,
+         zip_level[["high_risk_prop", "avg_zhvi_recent"]],
+         {"column": "high_risk_prop", "labels": HIGH_RISK_TERTILES,
+          "xlabel": "ZIP groups by high-risk proportion",
+          "title": "Housing values across ZIPs with different high-risk shares"}),
+        ("housing_by_low_risk_tertiles.png", tertile_boxplot,
+         zip_level[["low_risk_prop", "avg_zhvi_recent"]],
+         {"column": "low_risk_prop", "labels": LOW_RISK_TERTILES,
+          "xlabel": "ZIP groups by low-risk proportion",
+          "title": "Housing values across ZIPs with different low-risk shares"}),
+    ]
+
+
+# --- caching ---
+
+def figure_key(func, data, params, dpi):
+    sha = hashlib.sha256()
+    sha.update(inspect.getsource(func).encode("utf-8"))
+    sha.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    sha.update(f"dpi={dpi} matplotlib={matplotlib.__version__} seaborn={sns.__version__}".encode("utf-8"))
+    sha.update(json.dumps([str(col) for col in data.columns]).encode("utf-8"))
+    sha.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    return sha.hexdigest()
+
+
+def _render(func, data, path, dpi, params):
+    func(data, path, dpi, **params)
+    return path
+
+
+def render_figures(figures, results_dir, workers=None, dpi=FIGURE_DPI,
+                   cache_dir=FIGURE_CACHE_DIR, force=False):
+    # -> {file name: "cached" | "rendered"}
+    results_dir = Path(results_dir)
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    status = {}
+    pending = []
+    for name, func, data, params in figures:
+        key = figure_key(func, data, params, dpi)
+        cached = cache_dir / f"{Path(name).stem}-{key}.png"
+        if cached.exists() and not force:
+            shutil.copyfile(cached, results_dir / name)
+            status[name] = "cached"
+        else:
+            pending.append((name, cached, func, data, params))
+
+    if pending:
+        workers = workers or min(len(pending), os.cpu_count() or 1)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(_render, func, data, cached.with_suffix(".tmp.png"), dpi, params)
+                    for _, cached, func, data, params in pending
+                ]
+                for future in futures:
+                    future.result()
+        else:
+            for _, cached, func, data, params in pending:
+                _render(func, data, cached.with_suffix(".tmp.png"), dpi, params)
+
+        for name, cached, *_ in pending:
+            # drop older finished renders of the same figure before storing the
+            # new one; .tmp.png files may belong to another process still drawing
+            rendered = cached.with_suffix(".tmp.png")
+            finished = re.compile(rf"{re.escape(Path(name).stem)}-[0-9a-f]{{64}}\.png")
+            for stale in cache_dir.glob(f"{Path(name).stem}-*.png"):
+                if finished.fullmatch(stale.name) and stale != cached:
+                    stale.unlink(missing_ok=True)
+            rendered.replace(cached)
+            shutil.copyfile(cached, results_dir / name)
+            status[name] = "rendered"
+
+    return status
@@ -0,0 +1,111 @@
+# scripts/resampling.py
+#
+# Bootstrap confidence intervals and permutation p-values for Pearson
+# correlations between the columns of two tables (here: ZIP-level risk
+# proportions vs housing values).
+#
+# Resamples are drawn as index matrices, one batch of rows at a time, and every
+# (x, y) column pair is evaluated on the whole batch with array operations, so
+# there is no Python loop per resample. Each batch has its own random stream
+# spawned from the seed, so results depend only on the seed and the number of
+# resamples, not on how the batches are split across worker processes.
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# rows x resamples held in memory per batch
+BATCH_ELEMENTS = 2_000_000
+
+
+def batched_pearson(x, y):
+    # x: (batch, n, p), y: (batch, n, q) -> r of shape (batch, p, q)
+    x = x - x.mean(axis=1, keepdims=True)
+    y = y - y.mean(axis=1, keepdims=True)
+    cov = np.einsum("bnp,bnq->bpq", x, y)
+    norm = np.sqrt(np.einsum("bnp,bnp->bp", x, x)[:, :, None] * np.einsum("bnq,bnq->bq", y, y)[:, None, :])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return cov / norm
+
+
+def _bootstrap_batch(x, y, size, seed):
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(x), size=(size, len(x)))
+    return batched_pearson(x[idx], y[idx])
+
+
+def _permutation_batch(x, y, size, seed):
+    # permuting y's rows breaks the pairing with x
+    rng = np.random.default_rng(seed)
+    idx = rng.permuted(np.tile(np.arange(len(y)), (size, 1)), axis=1)
+    return batched_pearson(np.broadcast_to(x, (size,) + x.shape), y[idx])
+
+
+def _run_batches(func, x, y, n_resamples, seed_sequence, workers):
+    batch_size = max(1, min(n_resamples, BATCH_ELEMENTS // max(len(x), 1)))
+    sizes = [batch_size] * (n_resamples // batch_size)
+    if n_resamples % batch_size:
+        sizes.append(n_resamples % batch_size)
+    seeds = seed_sequence.spawn(len(sizes))
+    if workers and workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(func, [x] * len(sizes), [y] * len(sizes), sizes, seeds))
+    else:
+        results = [func(x, y, size, seed) for size, seed in zip(sizes, seeds)]
+    return np.concatenate(results, axis=0)
+
+
+def _significance(x, y, n_resamples, seed, confidence, workers):
+    # -> (r, ci_low, ci_high, p_value), each of shape (p, q)
+    observed = batched_pearson(x[None], y[None])[0]
+    bootstrap_seeds, permutation_seeds = np.random.SeedSequence(seed).spawn(2)
+    boot = _run_batches(_bootstrap_batch, x, y, n_resamples, bootstrap_seeds, workers)
+    perm = _run_batches(_permutation_batch, x, y, n_resamples, permutation_seeds, workers)
+
+    tail = (1 - confidence) / 2
+    # pairs with a constant column have no r in any resample; leave their
+    # interval NaN instead of asking nanquantile for an all-NaN slice
+    defined = ~np.isnan(boot).all(axis=0)
+    ci_low = np.full(observed.shape, np.nan)
+    ci_high = np.full(observed.shape, np.nan)
+    if defined.any():
+        ci_low[defined], ci_high[defined] = np.nanquantile(boot[:, defined], [tail, 1 - tail], axis=0)
+    # add-one correction so the p-value is never exactly zero; an undefined r
+    # has no p-value
+    extreme = (np.abs(perm) >= np.abs(observed) - 1e-12).sum(axis=0)
+    p_value = np.where(np.isnan(observed), np.nan, (extreme + 1) / (n_resamples + 1))
+    return observed, ci_low, ci_high, p_value
+
+
+def correlation_significance(df, x_columns, y_columns, n_resamples=10_000, seed=0,
+                             confidence=0.95, workers=None):
+    # -> one row per (x, y) pair with the Pearson r, a percentile bootstrap
+    # confidence interval and a two-sided permutation p-value. Missing values
+    # are dropped per y column: each y uses the rows where it and the x columns
+    # are present, so a gap in one y column does not change the others' r. y
+    # columns with the same missing rows are evaluated together.
+    x_columns, y_columns = list(x_columns), list(y_columns)
+    x_present = df[x_columns].notna().all(axis=1).to_numpy()
+    groups = {}
+    for y_col in y_columns:
+        keep = x_present & df[y_col].notna().to_numpy()
+        groups.setdefault(keep.tobytes(), (keep, []))[1].append(y_col)
+
+    stats = {}
+    for keep, group in groups.values():
+        x = df.loc[keep, x_columns].to_numpy(dtype=np.float64)
+        y = df.loc[keep, group].to_numpy(dtype=np.float64)
+        observed, ci_low, ci_high, p_value = _significance(x, y, n_resamples, seed, confidence, workers)
+        for i, x_col in enumerate(x_columns):
+            for j, y_col in enumerate(group):
+                stats[x_col, y_col] = {
+                    "x": x_col,
+                    "y": y_col,
+                    "n": int(keep.sum()),
+                    "r": observed[i, j],
+                    "ci_low": ci_low[i, j],
+                    "ci_high": ci_high[i, j],
+                    "p_value": p_value[i, j],
+                }
+    return pd.DataFrame([stats[x_col, y_col] for x_col in x_columns for y_col in y_columns])
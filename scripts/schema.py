@@ -0,0 +1,64 @@
+# scripts/schema.py
+#
+# Column encodings shared by the cleaning, integration and analysis stages.
+#
+# ZIP codes are normalized once during cleaning to int32 codes, so the
+# food/ZHVI merge and every per-ZIP groupby run on integer keys instead of
+# Python strings. The low-cardinality text columns (risk, facility type,
+# inspection result) are stored as pandas categoricals; Parquet keeps them
+# dictionary-encoded, so later stages read them back as categories.
+
+import numpy as np
+import pandas as pd
+
+ZIP_DTYPE = np.int32
+
+# known risk levels in their natural order; any other value seen in the data
+# is appended after these
+RISK_LEVELS = ["Risk 1 (High)", "Risk 2 (Medium)", "Risk 3 (Low)", "All"]
+
+# columns every inspection dataset has to provide (see the column mappings in
+# batch.py); the rest of 03_data_cleaning_food.COLUMNS_TO_KEEP is optional
+REQUIRED_FOOD_COLUMNS = ["license_", "address", "zip", "risk", "inspection_date"]
+
+CATEGORICAL_COLUMNS = {
+    "risk": RISK_LEVELS,
+    "facility_type": None,
+    "results": None,
+}
+
+
+def clean_zip_strings(values):
+    # -> (5-digit strings, boolean mask of valid ZIPs); a ZIP is valid when its
+    # first five characters are five digits and it does not start with "000"
+    zips = pd.Series(values).astype(str).str[:5].str.replace(r"\D", "", regex=True)
+    valid = (zips.str.len() == 5) & (~zips.str.startswith("000"))
+    return zips, valid
+
+
+def zip_codes(values):
+    # accepts cleaned 5-digit strings, ints, or floats read back from CSV
+    return pd.to_numeric(pd.Series(values), errors="raise").astype(ZIP_DTYPE).to_numpy()
+
+
+def zip_strings(values):
+    # int ZIP codes -> 5-digit strings for the CSV files people read; the int
+    # codes drop the leading zero of ZIPs such as 02134
+    return pd.Series(values).astype(str).str.zfill(5)
+
+
+def as_category(series, known=None):
+    # categories are the observed values, known levels first in their given order
+    observed = series.dropna().unique().tolist()
+    known = [value for value in (known or []) if value in observed]
+    extra = sorted(value for value in observed if value not in known)
+    return series.astype(pd.CategoricalDtype(known + extra))
+
+
+def encode_food(df):
+    df = df.copy()
+    df["zip"] = zip_codes(df["zip"])
+    for col, known in CATEGORICAL_COLUMNS.items():
+        if col in df.columns:
+            df[col] = as_category(df[col], known)
+    return df
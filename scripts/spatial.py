@@ -0,0 +1,140 @@
+# scripts/spatial.py
+#
+# Spatial ZIP index: assigns or checks the ZIP of each inspection from its
+# latitude/longitude.
+#
+# ZIP centroids come from a local file when one is given (e.g. the Census ZCTA
+# gazetteer, with GEOID/INTPTLAT/INTPTLONG columns), otherwise from the
+# inspections themselves: the median coordinates of each reported ZIP. Coordinates are projected to
+# kilometres on a local equirectangular plane, and a scipy cKDTree over the
+# centroids answers the nearest-centroid query for every inspection in one
+# batch, so re-assigning a few hundred thousand points takes well under a
+# second.
+#
+# Nearest centroid only approximates the ZIP boundaries (it is a Voronoi
+# partition), so it is used to fill in ZIPs that are missing or malformed and to
+# flag reported ZIPs that lie far from their own centroid; valid reported ZIPs
+# are never overwritten.
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from schema import ZIP_DTYPE
+
+EARTH_RADIUS_KM = 6371.0
+
+# points farther than this from every centroid (or, for reported ZIPs, from
+# their own centroid) are not trusted
+DEFAULT_MAX_KM = 5.0
+
+# accepted column names in a centroid file, first match wins
+CENTROID_COLUMNS = {
+    "zip": ["zip", "GEOID", "ZCTA5", "zcta"],
+    "latitude": ["latitude", "lat", "INTPTLAT"],
+    "longitude": ["longitude", "lon", "lng", "INTPTLONG"],
+}
+
+
+def read_centroids(path):
+    # -> DataFrame(zip, latitude, longitude); comma- or tab-separated
+    path = Path(path)
+    sep = "\t" if path.suffix == ".txt" else ","
+    raw = pd.read_csv(path, sep=sep, dtype=str)
+    raw.columns = raw.columns.str.strip()
+    centroids = {}
+    for name, candidates in CENTROID_COLUMNS.items():
+        found = [col for col in candidates if col in raw.columns]
+        if not found:
+            raise ValueError(f"{path}: no {name} column (expected one of {candidates})")
+        centroids[name] = raw[found[0]]
+    centroids = pd.DataFrame(centroids)
+    centroids["zip"] = pd.to_numeric(centroids["zip"].str.strip(), errors="coerce")
+    centroids["latitude"] = pd.to_numeric(centroids["latitude"], errors="coerce")
+    centroids["longitude"] = pd.to_numeric(centroids["longitude"], errors="coerce")
+    centroids = centroids.dropna()
+    return centroids.astype({"zip": ZIP_DTYPE}).reset_index(drop=True)
+
+
+def centroids_from_points(zips, latitude, longitude, min_points=3):
+    # median location per ZIP, from points whose ZIP is trusted
+    points = pd.DataFrame({"zip": zips, "latitude": latitude, "longitude": longitude}).dropna()
+    grouped = points.groupby("zip")
+    centroids = grouped[["latitude", "longitude"]].median()
+    centroids = centroids[grouped.size() >= min_points]
+    return centroids.reset_index().astype({"zip": ZIP_DTYPE})
+
+
+class ZipIndex:
+    # nearest-centroid lookups in kilometres
+
+    def __init__(self, centroids):
+        centroids = centroids.sort_values("zip").drop_duplicates("zip").reset_index(drop=True)
+        self.zips = centroids["zip"].to_numpy(dtype=ZIP_DTYPE)
+        latitude = centroids["latitude"].to_numpy(dtype=np.float64)
+        longitude = centroids["longitude"].to_numpy(dtype=np.float64)
+        # one projection for the whole area; fine at city or metro scale
+        self.origin_latitude = float(np.mean(latitude))
+        self.points = self.project(latitude, longitude)
+        self.tree = cKDTree(self.points)
+
+    def __len__(self):
+        return len(self.zips)
+
+    def project(self, latitude, longitude):
+        # (n, 2) kilometre coordinates on an equirectangular plane
+        scale = np.cos(np.radians(self.origin_latitude))
+        return np.column_stack([
+            np.radians(np.asarray(longitude, dtype=np.float64)) * scale * EARTH_RADIUS_KM,
+            np.radians(np.asarray(latitude, dtype=np.float64)) * EARTH_RADIUS_KM,
+        ])
+
+    def nearest(self, latitude, longitude):
+        # -> (nearest ZIP, distance in km); 0 and inf for missing coordinates
+        points = self.project(latitude, longitude)
+        finite = np.isfinite(points).all(axis=1)
+        zips = np.zeros(len(points), dtype=ZIP_DTYPE)
+        distance = np.full(len(points), np.inf)
+        if finite.any():
+            distance[finite], position = self.tree.query(points[finite])
+            zips[finite] = self.zips[position]
+        return zips, distance
+
+    def distance_to(self, zips, latitude, longitude):
+        # km from each point to the centroid of the given ZIP; NaN for ZIPs
+        # without a centroid
+        zips = np.asarray(zips, dtype=ZIP_DTYPE)
+        position = np.clip(np.searchsorted(self.zips, zips), 0, len(self.zips) - 1)
+        known = self.zips[position] == zips
+        offset = self.project(latitude, longitude) - self.points[position]
+        return np.where(known, np.hypot(offset[:, 0], offset[:, 1]), np.nan)
+
+
+def check_zips(zips, valid, latitude, longitude, index, max_km=DEFAULT_MAX_KM):
+    # zips: cleaned 5-digit strings; valid: mask from schema.clean_zip_strings
+    # -> (zips, valid mask, report). Invalid ZIPs within max_km of a centroid get
+    # the nearest centroid's ZIP; valid ZIPs are kept but counted as suspect when
+    # the point is more than max_km from that ZIP's centroid.
+    zips = pd.Series(zips)
+    valid = np.asarray(valid, dtype=bool)
+    latitude = np.asarray(latitude, dtype=np.float64)
+    longitude = np.asarray(longitude, dtype=np.float64)
+
+    nearest_zip, nearest_km = index.nearest(latitude, longitude)
+    reported = np.zeros(len(zips), dtype=ZIP_DTYPE)
+    reported[valid] = pd.to_numeric(zips[valid]).to_numpy()
+    own_km = index.distance_to(reported, latitude, longitude)
+
+    assigned = ~valid & (nearest_km <= max_km)
+    zips = zips.where(~assigned, pd.Series(nearest_zip, index=zips.index).astype(str).str.zfill(5))
+    report = {
+        "reported_valid": int(valid.sum()),
+        "assigned": int(assigned.sum()),
+        "unassigned": int((~valid & ~assigned).sum()),
+        "matches_nearest": int((valid & (reported == nearest_zip)).sum()),
+        "suspect": int((valid & (own_km > max_km)).sum()),
+        "no_centroid": int((valid & np.isnan(own_km)).sum()),
+    }
+    return zips, valid | assigned, report
@@ -0,0 +1,220 @@
+# scripts/stage_cache.py
+#
+# Content-addressed cache for pipeline stages.
+#
+# A stage is keyed by a SHA-256 over
+#   - the content hash of each input file (read from its .sha256 sidecar when
+#     the sidecar is at least as new as the file, otherwise from checksums.py),
+#   - the stage script and the shared helper modules in scripts/,
+#   - the full command line, so flags and parameters are part of the key.
+# After a successful run the outputs and the stage's console output are copied
+# to data/processed/cache/stages/<key>/. When a later run has the same key, the
+# outputs are restored from there and the stage is not run. Touching an input
+# without changing its content therefore does not re-run anything.
+#
+#
+# Nothing is removed automatically. The prune subcommand deletes cache items
+# not used for --max-age-days and then the least recently used ones until the
+# cache fits in --max-size-mb. It covers the stage entries, the ZHVI aggregate
+# files of stage 04 (zhvi_aggregates_<sha>.npz) and the batch ZHVI snapshots
+# (zhvi_snapshot_<sha>/); a cache hit refreshes an item's modification time.
+#
+# Usage (this is how the Snakefile calls every stage after acquisition):
+#   python scripts/stage_cache.py --inputs data/raw/zhvi.csv \
+#       --outputs data/processed/zhvi_cleaned.parquet data/processed/zhvi_cleaned.sha256 \
+#       -- python scripts/03_data_cleaning_zhvi.py
+#   python scripts/stage_cache.py prune --max-age-days 30 --max-size-mb 2048
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from checksums import cached_sha256, is_csv_copy, record, sha256_file, sidecar_path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+CACHE_DIR = Path("data/processed/cache")
+STAGE_CACHE_DIR = CACHE_DIR / "stages"
+
+DEFAULT_MAX_AGE_DAYS = 30
+DEFAULT_MAX_SIZE_MB = 2048
+
+
+def input_sha256(path):
+    sidecar = sidecar_path(path)
+    if sidecar != Path(path) and not is_csv_copy(path) and sidecar.exists() and sidecar.stat().st_mtime_ns >= Path(path).stat().st_mtime_ns:
+        return sidecar.read_text(encoding="utf-8").strip()
+    return cached_sha256(path)
+
+
+def code_files(command):
+    # the stage script(s) named on the command line plus every shared module
+    # (the non-numbered .py files in scripts/)
+    scripts = {Path(arg).resolve() for arg in command if arg.endswith(".py") and Path(arg).exists()}
+    shared = {path for path in SCRIPTS_DIR.glob("*.py") if not path.name[0].isdigit()}
+    return sorted(scripts | shared)
+
+
+def stage_key(command, inputs):
+    sha = hashlib.sha256()
+    sha.update(json.dumps(command).encode("utf-8"))
+    for path in sorted(inputs):
+        sha.update(f"input {Path(path).as_posix()} {input_sha256(path)}\n".encode("utf-8"))
+    for path in code_files(command):
+        sha.update(f"code {path.name} {sha256_file(path)}\n".encode("utf-8"))
+    return sha.hexdigest()
+
+
+def restore(entry_dir, outputs):
+    with open(entry_dir / "entry.json", "r", encoding="utf-8") as f:
+        entry = json.load(f)
+    # mark the entry as recently used for prune
+    os.utime(entry_dir / "entry.json")
+    # data files before their .sha256 sidecars, so sidecars end up the newer file
+    for output in sorted(outputs, key=lambda path: Path(path).suffix == ".sha256"):
+        target = Path(output)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(entry_dir / "files" / target.as_posix(), target)
+        record(target, entry["outputs"][target.as_posix()])
+    log_path = entry_dir / "log.txt"
+    if log_path.exists():
+        sys.stdout.write(log_path.read_text(encoding="utf-8"))
+
+
+def run_and_store(command, outputs, entry_dir):
+    # stream the stage's output as usual while keeping a copy for cache hits
+    log = []
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    for line in process.stdout:
+        sys.stdout.write(line)
+        log.append(line)
+    returncode = process.wait()
+    if returncode != 0:
+        return returncode
+
+    missing = [output for output in outputs if not Path(output).exists()]
+    if missing:
+        print(f"[stage_cache] stage finished without writing {missing}; not cached")
+        return 1
+
+    tmp_dir = entry_dir.with_name(f"{entry_dir.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    hashes = {}
+    for output in outputs:
+        target = tmp_dir / "files" / Path(output).as_posix()
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(output, target)
+        hashes[Path(output).as_posix()] = cached_sha256(output)
+    with open(tmp_dir / "entry.json", "w", encoding="utf-8") as f:
+        json.dump({"command": command, "outputs": hashes}, f, indent=2)
+    (tmp_dir / "log.txt").write_text("".join(log), encoding="utf-8")
+    if entry_dir.exists():
+        shutil.rmtree(tmp_dir)
+    else:
+        tmp_dir.rename(entry_dir)
+    return 0
+
+
+# --- pruning ---
+
+def tree_size(path):
+    path = Path(path)
+    if path.is_file():
+        return path.stat().st_size
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def cache_items(cache_dir=CACHE_DIR):
+    # -> [(path, last used, bytes)] of the prunable items, least recently used
+    # first; temporary files of runs in progress are left alone
+    cache_dir = Path(cache_dir)
+    items = [(entry.parent, entry.stat().st_mtime) for entry in (cache_dir / "stages").glob("*/entry.json")]
+    items += [(path, path.stat().st_mtime) for path in cache_dir.glob("zhvi_aggregates_*.npz")]
+    items += [(path, path.stat().st_mtime) for path in cache_dir.glob("zhvi_snapshot_*") if path.is_dir()]
+    items = [(path, used, tree_size(path)) for path, used in items if ".tmp" not in path.name]
+    return sorted(items, key=lambda item: item[1])
+
+
+def prune(cache_dir=CACHE_DIR, max_age_days=DEFAULT_MAX_AGE_DAYS, max_size_mb=DEFAULT_MAX_SIZE_MB,
+          dry_run=False):
+    # remove items older than max_age_days, then the oldest ones until the rest
+    # fits in max_size_mb (None disables either limit) -> (removed, kept) items
+    items = cache_items(cache_dir)
+    cutoff = None if max_age_days is None else time.time() - max_age_days * 86400
+    total = sum(size for _, _, size in items)
+    removed, kept = [], []
+    for path, used, size in items:
+        too_old = cutoff is not None and used < cutoff
+        too_big = max_size_mb is not None and total > max_size_mb * 1024 * 1024
+        if not (too_old or too_big):
+            kept.append((path, used, size))
+            continue
+        if not dry_run:
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+        removed.append((path, used, size))
+        total -= size
+    return removed, kept
+
+
+def prune_main(argv):
+    parser = argparse.ArgumentParser(prog="stage_cache.py prune",
+                                     description="Remove old or excess entries from the pipeline caches.")
+    parser.add_argument("--cache-dir", default=str(CACHE_DIR))
+    parser.add_argument("--max-age-days", type=float, default=DEFAULT_MAX_AGE_DAYS,
+                        help="remove items not used for this many days (0 removes everything)")
+    parser.add_argument("--max-size-mb", type=float, default=DEFAULT_MAX_SIZE_MB,
+                        help="then remove the least recently used items until the cache fits")
+    parser.add_argument("--dry-run", action="store_true", help="only list what would be removed")
+    args = parser.parse_args(argv)
+
+    removed, kept = prune(args.cache_dir, args.max_age_days, args.max_size_mb, dry_run=args.dry_run)
+    verb = "would remove" if args.dry_run else "removed"
+    for path, used, size in removed:
+        print(f"[stage_cache] {verb} {path} ({size / 1024 / 1024:.1f} MB, "
+              f"last used {time.strftime('%Y-%m-%d', time.localtime(used))})")
+    kept_mb = sum(size for _, _, size in kept) / 1024 / 1024
+    print(f"[stage_cache] {verb} {len(removed)} items; {len(kept)} items ({kept_mb:.1f} MB) kept")
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ["prune"]:
+        return prune_main(argv[1:])
+    if "--" not in argv:
+        print("usage: stage_cache.py --inputs ... --outputs ... -- <command>")
+        print("       stage_cache.py prune [--max-age-days N] [--max-size-mb N] [--dry-run]")
+        return 2
+    split = argv.index("--")
+    command = argv[split + 1:]
+
+    parser = argparse.ArgumentParser(description="Run a pipeline stage through the content-addressed cache.")
+    parser.add_argument("--inputs", nargs="*", default=[])
+    parser.add_argument("--outputs", nargs="+", required=True)
+    parser.add_argument("--cache-dir", default=str(STAGE_CACHE_DIR))
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always run the stage (the result is still stored)")
+    args = parser.parse_args(argv[:split])
+
+    key = stage_key(command, args.inputs)
+    entry_dir = Path(args.cache_dir) / key
+    if entry_dir.exists() and not args.no_cache:
+        print(f"[stage_cache] hit {key[:12]}: restoring {len(args.outputs)} outputs of {' '.join(command)}")
+        restore(entry_dir, args.outputs)
+        return 0
+
+    print(f"[stage_cache] miss {key[:12]}: running {' '.join(command)}")
+    entry_dir.parent.mkdir(parents=True, exist_ok=True)
+    return run_and_store(command, args.outputs, entry_dir)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
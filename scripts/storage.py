@@ -0,0 +1,57 @@
+# scripts/storage.py
+#
+# Storage helpers for the processed datasets handed between stages.
+#
+# Processed tables are written as typed, zstd-compressed Parquet so the next
+# stage does not have to re-parse text and re-infer types, and can read only
+# the columns it needs. A CSV copy can still be written next to the Parquet
+# file for people who want to open the data in a spreadsheet.
+
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from schema import zip_strings
+
+
+def table_path(path, suffix=".parquet"):
+    # accept "data/processed/zhvi_cleaned", "...zhvi_cleaned.csv" or "...zhvi_cleaned.parquet"
+    path = Path(path)
+    if path.suffix in (".csv", ".parquet"):
+        path = path.with_suffix("")
+    return path.with_name(path.name + suffix)
+
+
+def write_table(df, path, csv_copy=False, compression="zstd", row_group_size=None):
+    parquet_path = table_path(path)
+    # object columns read from CSV can mix str/int/float values, which Parquet
+    # cannot store in one column; store them as nullable strings instead
+    object_columns = df.columns[df.dtypes == object]
+    if len(object_columns) > 0:
+        df = df.astype({col: "string" for col in object_columns})
+    # smaller row groups let readers fetch a slice of a sorted table without
+    # decoding the whole file (see history_index.py)
+    df.to_parquet(parquet_path, index=False, compression=compression, row_group_size=row_group_size)
+    if csv_copy:
+        if "zip" in df.columns:
+            df = df.assign(zip=zip_strings(df["zip"]))
+        df.to_csv(table_path(path, ".csv"), index=False)
+    return parquet_path
+
+
+def read_table(path, columns=None):
+    # read the Parquet file if it exists, otherwise fall back to a CSV with the
+    # same name (e.g. one produced by an older run of the pipeline)
+    parquet_path = table_path(path)
+    if parquet_path.exists():
+        return pd.read_parquet(parquet_path, columns=columns)
+    return pd.read_csv(table_path(path, ".csv"), usecols=columns)
+
+
+def table_columns(path):
+    # column names without reading any data
+    parquet_path = table_path(path)
+    if parquet_path.exists():
+        return pq.read_schema(parquet_path).names
+    return pd.read_csv(table_path(path, ".csv"), nrows=0).columns.tolist()
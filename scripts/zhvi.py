@@ -0,0 +1,186 @@
+# scripts/zhvi.py
+#
+# Helpers for the Zillow ZHVI file.
+#
+# The raw file is wide: a few metadata columns followed by one column per month.
+# The month columns are identified once by parsing their names as dates, read
+# directly as float32, and kept as a NumPy matrix (one row per ZIP, one column
+# per month) next to a metadata table indexed by RegionName.
+
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from storage import read_table, write_table
+
+
+def month_columns(columns):
+    # month columns are the ones whose names parse as YYYY-MM-DD dates
+    parsed = pd.to_datetime(pd.Index(columns, dtype=object), format="%Y-%m-%d", errors="coerce")
+    return [col for col, date in zip(columns, parsed) if not pd.isna(date)]
+
+
+def geography_mask(path, geography=None, zips=None):
+    # First pass over only the columns used for filtering (City/State/Metro
+    # and/or RegionName). Returns a boolean mask over the data rows, or None
+    # when no filter is configured.
+    geography = {col: values for col, values in (geography or {}).items() if values}
+    if not geography and zips is None:
+        return None
+    usecols = list(geography) + (["RegionName"] if zips is not None else [])
+    keys = pd.read_csv(path, usecols=usecols, dtype=str)
+    mask = np.ones(len(keys), dtype=bool)
+    for col, values in geography.items():
+        mask &= keys[col].isin(values).to_numpy()
+    if zips is not None:
+        # RegionName loses leading zeros in the Zillow file; compare as 5-digit strings
+        wanted = {str(z).zfill(5) for z in zips}
+        mask &= keys["RegionName"].str.zfill(5).isin(wanted).to_numpy()
+    return mask
+
+
+def read_zhvi(path, geography=None, zips=None):
+    # geography: e.g. {"City": ["Chicago"], "State": ["IL"]}; zips: iterable of ZIPs.
+    # Rows outside the selection are skipped by the CSV parser, so they are never
+    # converted to values.
+    columns = pd.read_csv(path, nrows=0).columns.tolist()
+    months = month_columns(columns)
+    mask = geography_mask(path, geography, zips)
+    if mask is not None and not mask.any():
+        # e.g. a misspelt --city; an empty matrix would only fail later
+        selection = {col: values for col, values in (geography or {}).items() if values}
+        if zips is not None:
+            selection["zips"] = f"{len(set(zips))} ZIPs"
+        raise ValueError(f"No ZHVI rows in {path} match the geography filter {selection}")
+    skiprows = None
+    if mask is not None:
+        # line 0 is the header; data row i is on line i + 1
+        skiprows = lambda line: line > 0 and not mask[line - 1]
+    zhvi = pd.read_csv(path, dtype={col: np.float32 for col in months}, skiprows=skiprows)
+    return split_zhvi(zhvi, months)
+
+
+def split_zhvi(zhvi, months=None):
+    # -> (metadata DataFrame indexed by RegionName, float32 values matrix, month labels)
+    if months is None:
+        months = month_columns(zhvi.columns.tolist())
+    metadata_columns = [col for col in zhvi.columns if col not in months]
+    meta = zhvi[metadata_columns].set_index("RegionName", drop=False)
+    meta.index.name = None
+    values = zhvi[months].to_numpy(dtype=np.float32)
+    return meta, values, list(months)
+
+
+def to_wide(meta, values, months):
+    wide = pd.DataFrame(values, columns=months, index=meta.index)
+    return pd.concat([meta, wide], axis=1).reset_index(drop=True)
+
+
+def to_long(meta, values, months):
+    # compact (zip, month, value) table with the missing months dropped
+    rows, cols = np.nonzero(~np.isnan(values))
+    return pd.DataFrame({
+        "zip": meta["RegionName"].to_numpy()[rows],
+        "month": pd.to_datetime(pd.Index(months)[cols], format="%Y-%m-%d"),
+        "zhvi": values[rows, cols],
+    })
+
+
+# --- per-ZIP window aggregates ---
+#
+# Prefix sums and counts of the non-missing values along the month axis turn the
+# mean over any window of months into two subtractions per ZIP. They are
+# computed once per ZHVI snapshot and cached on disk under the snapshot's
+# SHA-256, so reruns with different windows never rescan the value matrix.
+
+def prefix_aggregates(values):
+    present = ~np.isnan(values)
+    sums = np.zeros((values.shape[0], values.shape[1] + 1), dtype=np.float64)
+    counts = np.zeros((values.shape[0], values.shape[1] + 1), dtype=np.int32)
+    np.cumsum(np.where(present, values, 0).astype(np.float64), axis=1, out=sums[:, 1:])
+    np.cumsum(present, axis=1, out=counts[:, 1:])
+    return sums, counts
+
+
+def window_mean(aggregates, start=None, end=None):
+    # mean per ZIP over months with start <= month <= end (ISO date strings,
+    # compared like the column names); missing months are skipped, and a window
+    # without any month gives NaN
+    if start is not None and end is not None and start > end:
+        raise ValueError(f"window start {start} is after its end {end}")
+    months = aggregates["months"]
+    i = 0 if start is None else int(np.searchsorted(months, start, side="left"))
+    j = len(months) if end is None else int(np.searchsorted(months, end, side="right"))
+    sums, counts = aggregates["sums"], aggregates["counts"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums[:, j] - sums[:, i]) / (counts[:, j] - counts[:, i])
+
+
+def build_aggregates(meta, values, months):
+    sums, counts = prefix_aggregates(values)
+    return {
+        "zips": meta["RegionName"].astype(str).to_numpy(dtype=str),
+        "months": np.array(months, dtype=str),
+        "sums": sums,
+        "counts": counts,
+        "latest": values[:, -1].astype(np.float64),
+    }
+
+
+def load_aggregates(table_path, sha, cache_dir):
+    # -> dict with zips, months, sums, counts, latest; built from the wide table
+    # at table_path unless a cache entry for this snapshot exists
+    cache_path = Path(cache_dir) / f"zhvi_aggregates_{sha}.npz"
+    if cache_path.exists():
+        # refresh the modification time so stage_cache.py prune sees it as used
+        os.utime(cache_path)
+        with np.load(cache_path, allow_pickle=False) as cached:
+            return {key: cached[key] for key in cached.files}, True
+
+    aggregates = build_aggregates(*split_zhvi(read_table(table_path)))
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(".tmp.npz")
+    np.savez(tmp_path, **aggregates)
+    tmp_path.replace(cache_path)
+    return aggregates, False
+
+
+# --- shared snapshots for batch runs ---
+#
+# One cleaned ZHVI snapshot serves every region of a batch run (see batch.py).
+# Its aggregates are saved as one .npy file per array so worker processes can
+# open them with np.load(mmap_mode="r"): all workers map the same page-cache
+# pages read-only instead of each parsing and holding its own copy.
+
+SNAPSHOT_ARRAYS = ["zips", "months", "sums", "counts", "latest"]
+
+
+def save_snapshot(meta, aggregates, directory):
+    # written to a sibling directory first, so a reader never sees half a snapshot
+    directory = Path(directory)
+    tmp_dir = directory.with_name(directory.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    for key in SNAPSHOT_ARRAYS:
+        np.save(tmp_dir / f"{key}.npy", aggregates[key])
+    write_table(meta.reset_index(drop=True), tmp_dir / "meta")
+    tmp_dir.replace(directory)
+    return directory
+
+
+def load_snapshot(directory, mmap=True):
+    # -> (metadata table, aggregates dict); the arrays are read-only memory maps
+    # unless mmap=False
+    directory = Path(directory)
+    mode = "r" if mmap else None
+    aggregates = {key: np.load(directory / f"{key}.npy", mmap_mode=mode) for key in SNAPSHOT_ARRAYS}
+    return read_table(directory / "meta"), aggregates
+
+
+def subset_aggregates(aggregates, rows):
+    # rows of the per-ZIP arrays (the months stay shared); a slice keeps views
+    # into the memory maps, an index array copies just those rows
+    return {key: value if key == "months" else value[rows] for key, value in aggregates.items()}
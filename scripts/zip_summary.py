@@ -0,0 +1,55 @@
+# scripts/zip_summary.py
+#
+# ZIP-level risk summary shared by the integration and analysis stages:
+# counts and proportions of establishments per risk level per ZIP, joined with
+# the ZIP's housing values.
+#
+# ZIP and risk are factorized to integer codes and all (ZIP, risk) counts come
+# from a single np.bincount, so there is no groupby/pivot/fillna chain and a
+# risk level that is absent from the data simply gets zero counts.
+
+import numpy as np
+import pandas as pd
+
+HOUSING_VALUE_COLUMNS = ["avg_zhvi_all_time", "avg_zhvi_recent", "zhvi_latest"]
+
+# risk label in the data -> column prefix in the summary
+RISK_LEVELS = {
+    "Risk 1 (High)": "high_risk",
+    "Risk 2 (Medium)": "medium_risk",
+    "Risk 3 (Low)": "low_risk",
+}
+
+
+def risk_count_matrix(zips, risks, levels):
+    # -> (sorted unique ZIPs, counts array of shape (n_zips, n_levels))
+    zip_codes, zip_index = pd.factorize(np.asarray(zips), sort=True)
+    level_codes = pd.Categorical(risks, categories=list(levels)).codes
+    counted = level_codes >= 0  # rows whose risk is not one of the levels are skipped
+    flat = zip_codes[counted].astype(np.int64) * len(levels) + level_codes[counted]
+    counts = np.bincount(flat, minlength=len(zip_index) * len(levels))
+    return zip_index, counts.reshape(len(zip_index), len(levels))
+
+
+def zip_summary(establishments, housing, risk_levels=None):
+    # establishments: one row per establishment with "zip" and "risk"
+    # housing: one row per ZIP with "zip" and the housing value columns
+    # risk_levels: {risk label: column prefix}, defaults to RISK_LEVELS
+    risk_levels = RISK_LEVELS if risk_levels is None else risk_levels
+    zip_index, counts = risk_count_matrix(
+        establishments["zip"], establishments["risk"], risk_levels.keys()
+    )
+    total = counts.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        proportions = counts / total[:, None]
+
+    columns = {"zip": zip_index}
+    for i, prefix in enumerate(risk_levels.values()):
+        columns[f"{prefix}_count"] = counts[:, i]
+    columns["total_inspections"] = total
+    for i, prefix in enumerate(risk_levels.values()):
+        columns[f"{prefix}_prop"] = proportions[:, i]
+    summary = pd.DataFrame(columns)
+
+    housing_columns = ["zip"] + [col for col in HOUSING_VALUE_COLUMNS if col in housing.columns]
+    return summary.merge(housing[housing_columns], on="zip", how="inner")